@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_asgi_application()
+
+# Without a reverse proxy in front, static files are served by the app
+# itself, as `runserver --insecure` does in development.
+if settings.SERVE_STATIC:
+    application = ASGIStaticFilesHandler(application)
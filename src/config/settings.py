@@ -20,6 +20,139 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 env = environ.Env()
 
+# SWAPI fetching: all calls share one pooled keep-alive session, pages after
+# the first one are downloaded concurrently by a bounded pool and transient
+# failures are retried with exponential backoff.
+SWAPI_CONCURRENT_FETCH = env.bool("SWAPI_CONCURRENT_FETCH", default=True)
+SWAPI_FETCH_WORKERS = env.int("SWAPI_FETCH_WORKERS", default=8)
+SWAPI_MAX_RETRIES = env.int("SWAPI_MAX_RETRIES", default=3)
+SWAPI_RETRY_BACKOFF = env.float("SWAPI_RETRY_BACKOFF", default=0.5)
+SWAPI_POOL_SIZE = env.int("SWAPI_POOL_SIZE", default=SWAPI_FETCH_WORKERS)
+SWAPI_CONNECT_TIMEOUT = env.float("SWAPI_CONNECT_TIMEOUT", default=3.05)
+SWAPI_READ_TIMEOUT = env.float("SWAPI_READ_TIMEOUT", default=30)
+
+# Resolved planet names are kept in the database across downloads. A cold
+# cache is warmed with one paged pass over `/planets/` when prefetch is on.
+PLANET_CACHE_TTL = env.int("PLANET_CACHE_TTL", default=24 * 60 * 60)
+SWAPI_PREFETCH_PLANETS = env.bool("SWAPI_PREFETCH_PLANETS", default=True)
+
+# Refreshes compare the upstream state (ETag/Last-Modified, record count and
+# latest `edited` timestamp) with the latest dataset and reuse it if unchanged.
+SWAPI_INCREMENTAL_REFRESH = env.bool("SWAPI_INCREMENTAL_REFRESH", default=True)
+
+# Downloads run as background jobs on a local worker pool. Jobs without
+# progress for DOWNLOAD_JOB_TIMEOUT seconds are treated as abandoned.
+DOWNLOAD_JOB_WORKERS = env.int("DOWNLOAD_JOB_WORKERS", default=1)
+DOWNLOAD_JOB_TIMEOUT = env.int("DOWNLOAD_JOB_TIMEOUT", default=15 * 60)
+
+# Retention, applied by `manage.py apply_retention` (e.g. from cron) and,
+# with RETENTION_AFTER_DOWNLOAD, after each download: the RETENTION_KEEP_LAST
+# newest datasets are kept, older ones are thinned to one per day past
+# RETENTION_DAILY_AFTER_DAYS days and one per week past
+# RETENTION_WEEKLY_AFTER_DAYS, then the oldest are dropped while their data
+# files and artifacts exceed RETENTION_MAX_BYTES. A rule set to 0 is off.
+# Files no dataset refers to are removed once older than
+# RETENTION_ORPHAN_GRACE seconds.
+RETENTION_KEEP_LAST = env.int("RETENTION_KEEP_LAST", default=0)
+RETENTION_DAILY_AFTER_DAYS = env.int("RETENTION_DAILY_AFTER_DAYS", default=0)
+RETENTION_WEEKLY_AFTER_DAYS = env.int("RETENTION_WEEKLY_AFTER_DAYS", default=0)
+RETENTION_MAX_BYTES = env.int("RETENTION_MAX_BYTES", default=0)
+RETENTION_ORPHAN_GRACE = env.int("RETENTION_ORPHAN_GRACE", default=24 * 60 * 60)
+RETENTION_AFTER_DOWNLOAD = env.bool("RETENTION_AFTER_DOWNLOAD", default=False)
+
+# Serve static files from the ASGI application (see config/asgi.py) when
+# no reverse proxy serves them.
+SERVE_STATIC = env.bool("SERVE_STATIC", default=True)
+
+# Blocking work (file reads, petl pipelines) of async views runs on a
+# bounded thread pool of ASYNC_VIEW_WORKERS threads per server process.
+ASYNC_VIEW_WORKERS = env.int("ASYNC_VIEW_WORKERS", default=4)
+
+# Dataset files never change, so previews and aggregations are sent with a
+# strong ETag (conditional requests are answered with a 304 before any file
+# is read) and may be cached for DATASET_CACHE_MAX_AGE seconds. Change
+# DATASET_ETAG_VERSION when a release changes how these responses look.
+DATASET_CACHE_MAX_AGE = env.int("DATASET_CACHE_MAX_AGE", default=365 * 24 * 60 * 60)
+DATASET_ETAG_VERSION = env("DATASET_ETAG_VERSION", default="1")
+
+# Number of datasets listed per page of the index page.
+INDEX_PAGE_SIZE = env.int("INDEX_PAGE_SIZE", default=50)
+
+# Every DATASET_INDEX_INTERVAL-th row's byte offset is kept in a sidecar
+# index, so previews seek close to the requested page.
+DATASET_INDEX_INTERVAL = env.int("DATASET_INDEX_INTERVAL", default=1000)
+
+# Storage format of new dataset files: "" (plain CSV), "gzip" or "zstd"
+# (requires the zstandard package). Compressed files are written in
+# independent blocks of DATASET_INDEX_INTERVAL rows, so previews only
+# decompress the blocks they read.
+DATASET_COMPRESSION = env("DATASET_COMPRESSION", default="")
+
+# Sorted views are served from a per-column permutation built with an
+# external merge sort: runs of SORT_RUN_ROWS rows are sorted in memory,
+# spilled to disk with their sort keys and merged.
+SORT_RUN_ROWS = env.int("SORT_RUN_ROWS", default=1_000_000)
+
+# Columns of the columnar sidecar are dictionary-encoded up to
+# COLUMNAR_MAX_DISTINCT distinct values; past that (e.g. unique names), the
+# dictionary is dropped so ingest memory doesn't grow with the row count.
+COLUMNAR_MAX_DISTINCT = env.int("COLUMNAR_MAX_DISTINCT", default=65_536)
+
+# Counting engine used for aggregations: "auto" (NumPy when installed),
+# "numpy" or "python" read the columnar sidecar, "petl" scans the CSV and
+# "parallel" scans it in record-aligned byte ranges on a pool of
+# SCAN_PROCESSES worker processes. Parallel scans running longer than
+# SCAN_TIMEOUT seconds are cancelled.
+AGGREGATION_ENGINE = env("AGGREGATION_ENGINE", default="auto")
+SCAN_PROCESSES = env.int("SCAN_PROCESSES", default=4)
+SCAN_TIMEOUT = env.float("SCAN_TIMEOUT", default=60)
+
+# Trend aggregations over several datasets count the uncached ones in a
+# pool of AGGREGATION_PROCESSES worker processes; TREND_MAX_DATASETS caps the
+# datasets of one query.
+AGGREGATION_PROCESSES = env.int("AGGREGATION_PROCESSES", default=4)
+TREND_MAX_DATASETS = env.int("TREND_MAX_DATASETS", default=100)
+
+# Aggregation results are memoized per (dataset, sorted column set) in the
+# "aggregations" cache; results above AGGREGATION_CACHE_MAX_ROWS rows are
+# not cached.
+AGGREGATION_CACHE_MAX_ROWS = env.int("AGGREGATION_CACHE_MAX_ROWS", default=10_000)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "aggregations": {
+        "BACKEND": env(
+            "AGGREGATION_CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": env("AGGREGATION_CACHE_LOCATION", default="aggregations"),
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": env.int("AGGREGATION_CACHE_MAX_ENTRIES", default=512),
+        },
+    },
+}
+
+# Requests and service stages are timed into the metrics served at
+# /metrics/ and logged as JSON lines at LOG_LEVEL (stage spans at DEBUG).
+# REQUEST_PROFILING profiles every request (cProfile and tracemalloc,
+# logged to "core.profile" with the REQUEST_PROFILING_TOP slowest
+# functions); with REQUEST_PROFILING_HEADER, only those sent with an
+# `X-Profile` header are.
+LOG_LEVEL = env("LOG_LEVEL", default="INFO")
+REQUEST_PROFILING = env.bool("REQUEST_PROFILING", default=False)
+REQUEST_PROFILING_TOP = env.int("REQUEST_PROFILING_TOP", default=30)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"json": {"()": "core.metrics.JsonFormatter"}},
+    "handlers": {"console": {"class": "logging.StreamHandler", "formatter": "json"}},
+    "loggers": {"core": {"handlers": ["console"], "level": LOG_LEVEL}},
+}
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
@@ -29,6 +162,8 @@ SECRET_KEY = "django-insecure-#ic8zq&65^(^q!p0u^h8*fo8kd*#2j9-m(ts%6r6&*s-6tvfh#
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env.bool("DEBUG", default=False)
 
+REQUEST_PROFILING_HEADER = env.bool("REQUEST_PROFILING_HEADER", default=DEBUG)
+
 ALLOWED_HOSTS = env.list("DJANGO_ALLOWED_HOSTS", default=[])
 
 # Application definition
@@ -44,6 +179,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
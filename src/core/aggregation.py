@@ -0,0 +1,203 @@
+import heapq
+import time
+from collections import Counter
+from concurrent.futures import FIRST_EXCEPTION, wait
+from concurrent.futures.process import BrokenProcessPool
+from math import prod
+
+import petl as etl
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .columnar import get_columnar
+from .metrics import BYTES_READ
+from .storage import DatasetSource, dataset_path, get_row_index
+from .workers import get_pool, reset_pool
+
+# Groups are counted into a dense `bincount` array instead of sorting the
+# keys with `unique` when there are at most DENSE_KEYS_PER_ROW possible
+# keys per row, and never more than DENSE_MAX_KEYS.
+DENSE_KEYS_PER_ROW = 4
+DENSE_MAX_KEYS = 1 << 24
+
+# Chunk workers check their deadline every this many rows.
+DEADLINE_CHECK_ROWS = 10_000
+
+# Number of byte-range chunks per scan process: smaller chunks even out
+# the load when some ranges parse slower than others.
+CHUNKS_PER_PROCESS = 4
+
+
+def _count_python(columns):
+    """
+    Single-pass hash counting of code combinations.
+    """
+    if len(columns) == 1:
+        return {(code,): n for code, n in Counter(columns[0].codes).items()}
+    return Counter(zip(*(col.codes for col in columns)))
+
+
+def _count_numpy(columns, row_count):
+    """
+    Vectorized counting: code columns are combined into one mixed-radix
+    int64 key per row, which is then counted with `bincount` (few possible
+    keys) or `unique`. Returns None when the key space doesn't fit int64.
+    """
+    radices = [max(col.cardinality, 1) for col in columns]
+    key_space = prod(radices)
+    if key_space >= 2**63:
+        return None
+    keys = np.zeros(row_count, dtype=np.int64)
+    for col, radix in zip(columns, radices):
+        keys *= radix
+        keys += np.frombuffer(col.codes, dtype=np.uint32)
+    if key_space <= min(DENSE_MAX_KEYS, DENSE_KEYS_PER_ROW * max(row_count, 1)):
+        dense = np.bincount(keys, minlength=1)
+        groups = np.flatnonzero(dense)
+        counts = dense[groups]
+    else:
+        groups, counts = np.unique(keys, return_counts=True)
+    codes = []
+    for radix in reversed(radices):
+        codes.append((groups % radix).tolist())
+        groups = groups // radix
+    return dict(zip(zip(*reversed(codes)), counts.tolist()))
+
+
+def _candidates(counts, limit):
+    """
+    Returns the groups that can make it into the top `limit`: every group
+    counted at least as often as the `limit`-th largest count, found with
+    a heap rather than sorting all groups.
+    """
+    if limit is None or limit >= len(counts):
+        return counts.items()
+    if limit < 1:
+        return []
+    threshold = heapq.nlargest(limit, counts.values())[-1]
+    return [(key, n) for key, n in counts.items() if n >= threshold]
+
+
+def count_combinations(filename, columns, limit=None, engine="auto"):
+    """
+    Counts the occurrences of value combinations of `columns` using the
+    dataset's columnar sidecar, reading only the selected columns.
+    `engine` is "numpy", "python" or "auto" (NumPy when installed).
+    Returns `(values, count)` pairs ordered by count (descending) and then
+    values, truncated to the top `limit` when given.
+    """
+    dataset = get_columnar(filename)
+    selected = [dataset.column(col).deduplicated() for col in columns]
+    counts = None
+    if engine in ("auto", "numpy") and np is not None:
+        counts = _count_numpy(selected, dataset.row_count)
+    if counts is None:
+        counts = _count_python(selected)
+    rows = [
+        (tuple(col.value(code) for col, code in zip(selected, key)), n)
+        for key, n in _candidates(counts, limit)
+    ]
+    rows.sort(key=lambda item: (-item[1], item[0]))
+    return rows[:limit]
+
+
+def _sorted_top(counts, limit):
+    rows = sorted(_candidates(counts, limit), key=lambda item: (-item[1], item[0]))
+    return rows[:limit]
+
+
+def chunk_ranges(index, parts):
+    """
+    Splits the data rows of a dataset file into up to `parts` byte ranges
+    `(start, end)` of about as many rows each, cut at row index
+    checkpoints so every range starts on a record (or, for compressed
+    files, block) boundary.
+    """
+    checkpoints = len(index.offsets)
+    parts = max(1, min(parts, checkpoints))
+    bounds = [index.offsets[checkpoints * i // parts] for i in range(parts)]
+    bounds.append(index.file_size)
+    return list(zip(bounds, bounds[1:])) if checkpoints else []
+
+
+def _count_chunk(path, start, end, header, columns, deadline):
+    """
+    Counts the value combinations of `columns` in the byte range
+    `[start, end)` of a dataset file into a partial hash map. Runs in a
+    scan worker process; gives up with TimeoutError past `deadline`.
+    """
+    if time.time() > deadline:
+        raise TimeoutError("Aggregation scan cancelled: time budget exceeded.")
+    table = etl.pushheader(etl.fromcsv(DatasetSource(path, start, end)), header)
+    counts = Counter()
+    for number, row in enumerate(etl.data(etl.cut(table, *columns)), 1):
+        counts[tuple(row)] += 1
+        if number % DEADLINE_CHECK_ROWS == 0 and time.time() > deadline:
+            raise TimeoutError("Aggregation scan cancelled: time budget exceeded.")
+    return counts
+
+
+def count_combinations_parallel(filename, columns, limit=None, timeout=None):
+    """
+    Counts value combinations by scanning the CSV file in parallel: the
+    file is split into record-aligned byte ranges (see `chunk_ranges()`),
+    counted by a long-lived pool of `SCAN_PROCESSES` worker processes and
+    the partial counts are merged. Raises TimeoutError when the scan takes
+    more than `timeout` seconds (default `SCAN_TIMEOUT`), cancelling the
+    chunks not yet started; running ones stop at their next deadline
+    check.
+    Falls back to `count_combinations_petl()` for compressed files
+    without a row index.
+    """
+    index = get_row_index(filename)
+    if index is None:
+        return count_combinations_petl(filename, columns, limit)
+    path = dataset_path(filename)
+    header = etl.header(etl.fromcsv(DatasetSource(path)))
+    for column in columns:
+        if column not in header:
+            raise KeyError(column)
+    timeout = settings.SCAN_TIMEOUT if timeout is None else timeout
+    deadline = time.time() + timeout
+    ranges = chunk_ranges(index, settings.SCAN_PROCESSES * CHUNKS_PER_PROCESS)
+    args = (header, columns, deadline)
+
+    counts = Counter()
+    if len(ranges) == 1:
+        counts = _count_chunk(path, *ranges[0], *args)
+    elif ranges:
+        pool = get_pool("scan", settings.SCAN_PROCESSES)
+        try:
+            futures = [pool.submit(_count_chunk, path, *r, *args) for r in ranges]
+        except BrokenProcessPool:
+            reset_pool("scan", pool)
+            raise
+        done, pending = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+        if pending:
+            for future in pending:
+                future.cancel()
+            if not any(future.exception() for future in done):
+                raise TimeoutError("Aggregation scan cancelled: time budget exceeded.")
+        for future in done:
+            if isinstance(future.exception(), BrokenProcessPool):
+                reset_pool("scan", pool)
+            counts.update(future.result())
+        BYTES_READ.inc(sum(end - start for start, end in ranges))
+    return _sorted_top(counts, limit)
+
+
+def count_combinations_petl(filename, columns, limit=None):
+    """
+    Reference implementation over the CSV file with petl.
+    """
+    table = etl.fromcsv(DatasetSource(dataset_path(filename)))
+    agg_table = etl.aggregate(table, key=columns, aggregation=len)
+    agg_table = etl.sort(agg_table, "value", reverse=True)
+    if limit is not None:
+        agg_table = etl.head(agg_table, max(limit, 0))
+    width = len(columns)
+    return [(tuple(row[:width]), row[width]) for row in etl.data(agg_table)]
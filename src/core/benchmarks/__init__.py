@@ -0,0 +1,5 @@
+"""
+Benchmark suite: a local SWAPI stand-in (`fakeswapi`), synthetic dataset
+generation (`synthetic`) and a runner measuring the service functions
+(`runner`). Run it with `python manage.py benchmark`.
+"""
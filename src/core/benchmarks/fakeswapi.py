@@ -0,0 +1,106 @@
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from .synthetic import PLANETS, character, planet_name
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, base_url, collection, count, make):
+        page = int(self.query.get("page", 1))
+        size = self.server.fake.page_size
+        first = (page - 1) * size + 1
+        last = min(first + size - 1, count)
+        pages = math.ceil(count / size)
+        url = f"{base_url}/{collection}/"
+        return {
+            "count": count,
+            "next": f"{url}?page={page + 1}" if page < pages else None,
+            "previous": f"{url}?page={page - 1}" if page > 1 else None,
+            "results": [make(number) for number in range(first, last + 1)],
+        }
+
+    def do_GET(self):
+        fake = self.server.fake
+        fake.count_request()
+        if fake.latency:
+            time.sleep(fake.latency)
+        parts = urlsplit(self.path)
+        self.query = dict(parse_qsl(parts.query))
+        base_url = f"http://{self.headers['Host']}/api"
+        path = [part for part in parts.path.split("/") if part]
+        if path == ["api", "people"]:
+            self._send(
+                200,
+                self._page(
+                    base_url,
+                    "people",
+                    fake.records,
+                    lambda n: character(n, base_url, fake.seed),
+                ),
+            )
+        elif path == ["api", "planets"]:
+            self._send(
+                200,
+                self._page(
+                    base_url, "planets", PLANETS, lambda n: fake.planet(base_url, n)
+                ),
+            )
+        elif len(path) == 3 and path[:2] == ["api", "planets"] and path[2].isdigit():
+            self._send(200, fake.planet(base_url, int(path[2])))
+        else:
+            self._send(404, {"detail": "Not found"})
+
+
+class FakeSwapi:
+    """
+    In-process SWAPI stand-in serving `records` synthetic people (and
+    their planets) over HTTP, `page_size` per page, each response delayed
+    by `latency` seconds. Use as a context manager; `url` is the API root
+    to use as `SWAPI_URL`.
+    """
+
+    def __init__(self, records=1000, page_size=10, latency=0.0, seed=0):
+        self.records = records
+        self.page_size = page_size
+        self.latency = latency
+        self.seed = seed
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self.url = None
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    @staticmethod
+    def planet(base_url, number):
+        return {"name": planet_name(number), "url": f"{base_url}/planets/{number}/"}
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        host, port = self._server.server_address
+        self.url = f"http://{host}:{port}/api"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,232 @@
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from django.db import connections, transaction
+from django.test.utils import override_settings
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+from ..cache import aggregation_cache
+from ..services import (
+    aggregate_provided_dataset,
+    fetch_and_store_characters,
+    load_dataset_preview,
+    store_table,
+)
+from ..storage import data_dir
+from .fakeswapi import FakeSwapi
+from .synthetic import SyntheticTable
+
+AGGREGATIONS = {
+    "aggregate_1col": ["homeworld"],
+    "aggregate_2col": ["homeworld", "eye_color"],
+    "aggregate_3col": ["gender", "hair_color", "eye_color"],
+}
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile `q` (0-100) of `values`.
+    """
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def peak_rss():
+    """
+    Peak resident set size of the current process in bytes (None where
+    the `resource` module is unavailable).
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if platform.system() == "Darwin" else usage * 1024
+
+
+def measure(func, iterations):
+    """
+    Calls `func()` (which returns the number of rows it processed)
+    `iterations` times and returns latency, throughput and memory figures.
+    """
+    latencies = []
+    rows = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        rows += func()
+        latencies.append(time.perf_counter() - started)
+    total = sum(latencies)
+    return {
+        "iterations": iterations,
+        "rows": rows,
+        "total_seconds": total,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rows_per_second": rows / total if total else None,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def _measure_child(conn, func, iterations):
+    try:
+        conn.send(measure(func, iterations))
+    except Exception as e:
+        conn.send({"error": repr(e)})
+    finally:
+        conn.close()
+
+
+def run_case(func, iterations, isolate=True):
+    """
+    Measures one case. With `isolate`, it runs in a forked process, so the
+    reported peak RSS is that of the case alone rather than the high-water
+    mark of everything measured before it.
+    """
+    if not isolate:
+        return measure(func, iterations)
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_child, args=(child, func, iterations))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"Benchmark case failed: {result['error']}")
+    return result
+
+
+def _fetch_case(server, work_dir):
+    def fetch():
+        os.environ["SWAPI_URL"] = server.url
+        with override_settings(BASE_DIR=work_dir, SWAPI_INCREMENTAL_REFRESH=False):
+            # Rolled back, so every iteration starts with a cold planet
+            # cache and leaves no datasets behind.
+            with transaction.atomic():
+                ds = fetch_and_store_characters()
+                transaction.set_rollback(True)
+            shutil.rmtree(data_dir(), ignore_errors=True)
+        return ds.row_count
+
+    return fetch
+
+
+def _preview_case(name, row_count, seed):
+    rng = random.Random(seed)
+
+    def preview():
+        offset = rng.randrange(max(row_count, 1))
+        return len(load_dataset_preview(name, offset=offset, limit=10))
+
+    return preview
+
+
+def _aggregate_case(name, columns, row_count):
+    def aggregate():
+        aggregation_cache.invalidate(name)
+        aggregate_provided_dataset(name, columns)
+        return row_count
+
+    return aggregate
+
+
+def run_benchmarks(
+    rows=10_000,
+    fetch_records=1_000,
+    page_size=10,
+    latency=0.0,
+    iterations=20,
+    fetch_iterations=3,
+    isolate=True,
+    seed=0,
+):
+    """
+    Runs the suite and returns its results:
+    - `fetch`: `fetch_and_store_characters()` against a `FakeSwapi` of
+      `fetch_records` people (`page_size` per page, `latency` seconds per
+      response),
+    - `preview`: `load_dataset_preview()` pages at random offsets of a
+      synthetic dataset of `rows` rows,
+    - `aggregate_*`: uncached `aggregate_provided_dataset()` calls on it.
+    Everything is written to a temporary data directory.
+    """
+    previous_url = os.environ.get("SWAPI_URL")
+    with tempfile.TemporaryDirectory() as work_dir:
+        cases = {}
+        with FakeSwapi(fetch_records, page_size, latency, seed) as server:
+            cases["fetch"] = run_case(
+                _fetch_case(server, os.path.join(work_dir, "fetch")),
+                fetch_iterations,
+                isolate,
+            )
+            cases["fetch"]["swapi_requests"] = server.requests
+        if previous_url is None:
+            os.environ.pop("SWAPI_URL", None)
+        else:
+            os.environ["SWAPI_URL"] = previous_url
+
+        with override_settings(BASE_DIR=work_dir):
+            started = time.perf_counter()
+            ds = store_table(SyntheticTable(rows, seed))
+            ingest_seconds = time.perf_counter() - started
+            name = ds.storage_name
+            cases["preview"] = run_case(
+                _preview_case(name, rows, seed), iterations, isolate
+            )
+            for case, columns in AGGREGATIONS.items():
+                cases[case] = run_case(
+                    _aggregate_case(name, columns, rows), iterations, isolate
+                )
+
+    return {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {
+            "rows": rows,
+            "fetch_records": fetch_records,
+            "page_size": page_size,
+            "latency": latency,
+            "iterations": iterations,
+            "fetch_iterations": fetch_iterations,
+            "seed": seed,
+        },
+        "synthetic_ingest_seconds": ingest_seconds,
+        "cases": cases,
+    }
+
+
+def save_results(results, directory):
+    """
+    Saves results as a timestamped JSON file in `directory`, returns its path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = results["started"].replace(":", "").replace("-", "")
+    path = os.path.join(directory, f"benchmark_{stamp}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def load_latest(directory, exclude=None):
+    """
+    Loads the most recent saved results in `directory` (other than the
+    file `exclude`), or None.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "benchmark_*.json")))
+    paths = [path for path in paths if path != exclude]
+    if not paths:
+        return None
+    with open(paths[-1]) as f:
+        return json.load(f)
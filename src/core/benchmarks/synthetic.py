@@ -0,0 +1,91 @@
+import csv
+import random
+
+from petl.util.base import Table
+
+HAIR_COLORS = ["blond", "brown", "black", "none", "white", "auburn", "grey", "n/a"]
+SKIN_COLORS = ["fair", "gold", "white, blue", "light", "green", "pale", "dark"]
+EYE_COLORS = ["blue", "yellow", "red", "brown", "blue-gray", "black", "orange"]
+GENDERS = ["male", "female", "n/a", "hermaphrodite", "none"]
+PLANETS = 60
+
+# Columns of a stored dataset, as written by `services.transform_data()`.
+HEADER = (
+    "name",
+    "height",
+    "mass",
+    "hair_color",
+    "skin_color",
+    "eye_color",
+    "birth_year",
+    "gender",
+    "homeworld",
+    "date",
+)
+
+
+def planet_name(number):
+    return f"Planet {number}"
+
+
+def character(number, base_url="http://swapi/api", seed=0):
+    """
+    Returns a SWAPI-like people record. Records are derived from their
+    number alone, so any page can be generated independently.
+    """
+    rng = random.Random(seed * 1_000_003 + number)
+    edited = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00Z"
+    return {
+        "name": f"Character {number}",
+        "height": str(rng.randint(60, 240)) if rng.random() > 0.05 else "unknown",
+        "mass": str(rng.randint(20, 1400)) if rng.random() > 0.1 else "unknown",
+        "hair_color": rng.choice(HAIR_COLORS),
+        "skin_color": rng.choice(SKIN_COLORS),
+        "eye_color": rng.choice(EYE_COLORS),
+        "birth_year": f"{rng.randint(1, 900)}BBY" if rng.random() > 0.1 else "unknown",
+        "gender": rng.choice(GENDERS),
+        "homeworld": f"{base_url}/planets/{rng.randint(1, PLANETS)}/",
+        "films": [f"{base_url}/films/{rng.randint(1, 6)}/"],
+        "species": [],
+        "vehicles": [],
+        "starships": [],
+        "created": "2024-12-09T13:50:51.644000Z",
+        "edited": edited,
+        "url": f"{base_url}/people/{number}/",
+    }
+
+
+class SyntheticTable(Table):
+    """
+    petl table of `rows` synthetic character rows in the stored dataset
+    layout (see `HEADER`), generated lazily so any size fits in memory.
+    """
+
+    def __init__(self, rows, seed=0):
+        self.rows = rows
+        self.seed = seed
+
+    def __iter__(self):
+        yield HEADER
+        for number in range(1, self.rows + 1):
+            rec = character(number, seed=self.seed)
+            yield (
+                rec["name"],
+                rec["height"],
+                rec["mass"],
+                rec["hair_color"],
+                rec["skin_color"],
+                rec["eye_color"],
+                rec["birth_year"],
+                rec["gender"],
+                planet_name(int(rec["homeworld"].rstrip("/").rsplit("/", 1)[-1])),
+                rec["edited"][:10],
+            )
+
+
+def write_csv(path, rows, seed=0):
+    """
+    Writes a synthetic character CSV of `rows` rows to `path`.
+    """
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(SyntheticTable(rows, seed))
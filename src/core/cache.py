@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import AGGREGATION_CACHE
+from .storage import dataset_path
+
+
+class AggregationCache:
+    """
+    Memoizes aggregation results. Datasets never change once written, so a
+    result is keyed by the dataset file and the canonical (sorted) column
+    set: the same columns picked in another order are served from the same
+    entry. Entries live in the `AGGREGATION_CACHE_ALIAS` cache backend (LRU
+    bounded by its MAX_ENTRIES); results with more than
+    `AGGREGATION_CACHE_MAX_ROWS` rows are not cached at all.
+    Keys include a per-file version, which `invalidate()` bumps with an
+    atomic `incr`, so concurrent requests never lose an invalidation; the
+    stale entries age out of the LRU.
+    Hit/miss counters are kept per process, see `stats()`.
+    """
+
+    def __init__(self, alias="aggregations"):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _key(*parts):
+        digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return f"agg:{digest}"
+
+    def _count(self, hit):
+        AGGREGATION_CACHE.inc(result="hit" if hit else "miss")
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _version(self, filename):
+        key = self._key("version", dataset_path(filename))
+        version = self.cache.get(key)
+        if version is None:
+            # Starting from the clock rather than 1, entries written before
+            # the version itself got evicted don't become current again.
+            self.cache.add(key, time.time_ns())
+            version = self.cache.get(key)
+        return version
+
+    def _canonical_key(self, filename, columns, limit):
+        canonical = tuple(sorted(columns))
+        version = self._version(filename)
+        return canonical, self._key(dataset_path(filename), version, canonical, limit)
+
+    @staticmethod
+    def _reorder(canonical, columns, rows):
+        if list(canonical) == list(columns):
+            return rows
+        order = [canonical.index(col) for col in columns]
+        rows = [(tuple(values[i] for i in order), n) for values, n in rows]
+        rows.sort(key=lambda item: (-item[1], item[0]))
+        return rows
+
+    def get(self, filename, columns, limit):
+        """
+        Returns the cached `(values, count)` rows for `columns` (values in
+        the order of `columns`), or None.
+        """
+        canonical, key = self._canonical_key(filename, columns, limit)
+        rows = self.cache.get(key)
+        self._count(rows is not None)
+        return None if rows is None else self._reorder(canonical, columns, rows)
+
+    def put(self, filename, columns, limit, rows):
+        """
+        Caches `rows` computed for the canonical (sorted) `columns` and
+        returns them with values in the order of `columns`.
+        """
+        canonical, key = self._canonical_key(filename, columns, limit)
+        if len(rows) <= settings.AGGREGATION_CACHE_MAX_ROWS:
+            self.cache.set(key, rows)
+        return self._reorder(canonical, columns, rows)
+
+    def get_or_compute(self, filename, columns, limit, compute):
+        """
+        Returns `(values, count)` rows for `columns`, calling
+        `compute(canonical_columns)` on a miss. Values come back in the
+        order of `columns`.
+        """
+        rows = self.get(filename, columns, limit)
+        if rows is None:
+            rows = self.put(filename, columns, limit, compute(sorted(columns)))
+        return rows
+
+    def invalidate(self, filename):
+        """
+        Drops every cached result of the given dataset file.
+        """
+        try:
+            self.cache.incr(self._key("version", dataset_path(filename)))
+        except ValueError:
+            # No version: nothing is cached for the file.
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+aggregation_cache = AggregationCache()
@@ -0,0 +1,335 @@
+import json
+import mmap
+import os
+import shutil
+from array import array
+from collections import Counter
+
+import petl as etl
+from django.conf import settings
+from petl.util.base import Table
+
+from .storage import DatasetSource, dataset_path, sidecar_path, staging_path
+
+COLUMNS = "columns"
+FLUSH_ROWS = 64 * 1024
+
+
+def _map(path, typecode):
+    """
+    Memory-maps `path` read-only and returns it as a typed memoryview.
+    """
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return memoryview(b"").cast(typecode)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm).cast(typecode)
+
+
+class _ColumnWriter:
+    def __init__(self, directory, number, max_distinct):
+        self.codes_file = open(os.path.join(directory, f"{number}.codes"), "wb")
+        self.values_file = open(os.path.join(directory, f"{number}.values"), "wb")
+        self.offsets_file = open(os.path.join(directory, f"{number}.offsets"), "wb")
+        self.max_distinct = max_distinct
+        self.lookup = {}
+        self.spilled = False
+        self.entries = 0
+        self.end = 0
+        self.offsets = array("Q", [0])
+        self.codes = array("I")
+        self.counts = array("Q")
+
+    def _add_entry(self, value):
+        encoded = value.encode()
+        self.values_file.write(encoded)
+        self.end += len(encoded)
+        self.offsets.append(self.end)
+        self.entries += 1
+        return self.entries - 1
+
+    def append(self, value):
+        value = "" if value is None else str(value)
+        if self.spilled:
+            self.codes.append(self._add_entry(value))
+            return
+        code = self.lookup.get(value)
+        if code is None:
+            if len(self.lookup) == self.max_distinct:
+                # Too many distinct values to keep a dictionary of: from
+                # now on every row stores its own value.
+                self.spilled = True
+                self.lookup = {}
+                self.counts = None
+                self.codes.append(self._add_entry(value))
+                return
+            code = self.lookup[value] = self._add_entry(value)
+            self.counts.append(0)
+        self.codes.append(code)
+        self.counts[code] += 1
+
+    def frequencies(self):
+        """
+        Returns the `(value, count)` table of the column, most frequent
+        first, or None for a spilled column.
+        """
+        if self.spilled:
+            return None
+        return sorted(zip(self.lookup, self.counts), key=lambda vc: (-vc[1], vc[0]))
+
+    def flush(self):
+        self.codes.tofile(self.codes_file)
+        self.codes = array("I")
+        self.offsets.tofile(self.offsets_file)
+        self.offsets = array("Q")
+
+    def close(self):
+        if self.codes_file.closed:
+            return
+        self.flush()
+        for f in (self.codes_file, self.values_file, self.offsets_file):
+            f.close()
+
+
+class ColumnarWriter:
+    """
+    Writes the columnar sidecar of a dataset. Each column is
+    dictionary-encoded into three files:
+    - `<n>.codes`: one unsigned 32-bit code per row,
+    - `<n>.values`: the distinct values, UTF-8 encoded back to back,
+    - `<n>.offsets`: unsigned 64-bit offsets of each value in `.values`.
+    Past `COLUMNAR_MAX_DISTINCT` distinct values, a column's dictionary is
+    dropped and the following rows store their value as is (a value may
+    then have several codes), so memory stays bounded whatever the number
+    of rows; such columns are listed as `spilled` in the metadata.
+    Files are written to a staging directory which becomes the sidecar of
+    the dataset file given to `finish()`.
+    """
+
+    def __init__(self):
+        self.tmp_path = staging_path()
+        self.header = None
+        self.columns = []
+        self.row_count = 0
+
+    def _start(self, header):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.header = [str(f) for f in header]
+        self.columns = [
+            _ColumnWriter(self.tmp_path, number, settings.COLUMNAR_MAX_DISTINCT)
+            for number in range(len(header))
+        ]
+
+    def append(self, row):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.row_count += 1
+        if self.row_count % FLUSH_ROWS == 0:
+            for column in self.columns:
+                column.flush()
+
+    def tee(self, table):
+        """
+        Returns a petl view passing `table` through unchanged while
+        appending every row to this writer.
+        """
+        return _TeeView(table, self)
+
+    def profile(self):
+        """
+        Returns the one-pass profile gathered while writing: row count and,
+        per column, the value frequency table (None for spilled columns).
+        """
+        return {
+            "row_count": self.row_count,
+            "columns": {
+                name: column.frequencies()
+                for name, column in zip(self.header or [], self.columns)
+            },
+        }
+
+    def finish(self, filename, file_size):
+        if self.header is None:
+            self._start(())
+        for column in self.columns:
+            column.close()
+        meta = {
+            "columns": self.header,
+            "row_count": self.row_count,
+            "file_size": file_size,
+            "spilled": [
+                number for number, column in enumerate(self.columns) if column.spilled
+            ],
+        }
+        with open(os.path.join(self.tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        path = sidecar_path(filename, COLUMNS)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(self.tmp_path, path)
+
+    def abort(self):
+        for column in self.columns:
+            column.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class _TeeView(Table):
+    def __init__(self, table, writer):
+        self.table = table
+        self.writer = writer
+
+    def __iter__(self):
+        it = iter(self.table)
+        header = next(it, None)
+        if header is None:
+            return
+        self.writer._start(header)
+        yield header
+        for row in it:
+            self.writer.append(row)
+            yield row
+
+
+class Column:
+    """
+    Read-only, memory-mapped view of one dictionary-encoded column.
+    `codes[row]` is the code of a row's value; `value(code)` decodes it.
+    Codes are unique per value unless the column is `spilled`.
+    """
+
+    def __init__(self, directory, number, spilled=False):
+        self.codes = _map(os.path.join(directory, f"{number}.codes"), "I")
+        self.offsets = _map(os.path.join(directory, f"{number}.offsets"), "Q")
+        self.values = _map(os.path.join(directory, f"{number}.values"), "B")
+        self.spilled = spilled
+
+    @property
+    def cardinality(self):
+        return len(self.offsets) - 1
+
+    def value(self, code):
+        return str(self.values[self.offsets[code] : self.offsets[code + 1]], "utf-8")
+
+    def deduplicated(self):
+        """
+        Returns the column with one code per distinct value: itself, or
+        for a spilled column an in-memory re-encoding of it.
+        """
+        return _DeduplicatedColumn(self) if self.spilled else self
+
+
+class _DeduplicatedColumn:
+    def __init__(self, column):
+        lookup = {}
+        remap = array("I")
+        for code in range(column.cardinality):
+            remap.append(lookup.setdefault(column.value(code), len(lookup)))
+        self.values = list(lookup)
+        self.codes = array("I", (remap[code] for code in column.codes))
+        self.spilled = False
+
+    @property
+    def cardinality(self):
+        return len(self.values)
+
+    def value(self, code):
+        return self.values[code]
+
+
+class ColumnarDataset:
+    """
+    Reader of a dataset's columnar sidecar. Columns are mapped lazily,
+    so only the ones a query touches are ever read.
+    """
+
+    def __init__(self, filename):
+        self.path = sidecar_path(filename, COLUMNS)
+        with open(os.path.join(self.path, "meta.json")) as f:
+            meta = json.load(f)
+        self.header = meta["columns"]
+        self.row_count = meta["row_count"]
+        self.file_size = meta["file_size"]
+        self.spilled = set(meta.get("spilled", ()))
+        self._columns = {}
+
+    def column(self, name):
+        if name not in self._columns:
+            try:
+                number = self.header.index(name)
+            except ValueError:
+                raise KeyError(f"Unknown column: {name}")
+            self._columns[name] = Column(self.path, number, number in self.spilled)
+        return self._columns[name]
+
+    def profile(self):
+        """
+        Builds the same profile as `ColumnarWriter.profile()` from the
+        sidecar, for datasets written before profiles existed.
+        """
+        columns = {}
+        for name in self.header:
+            column = self.column(name)
+            if column.spilled:
+                columns[name] = None
+                continue
+            counts = Counter(column.codes)
+            columns[name] = sorted(
+                ((column.value(code), n) for code, n in counts.items()),
+                key=lambda vc: (-vc[1], vc[0]),
+            )
+        return {"row_count": self.row_count, "columns": columns}
+
+    def rows(self, offset, limit):
+        """
+        Returns `limit` rows starting at row `offset` as a list of dicts.
+        """
+        offset = max(offset, 0)
+        return self.rows_at(range(offset, min(offset + limit, self.row_count)))
+
+    def rows_at(self, row_ids):
+        """
+        Returns the rows with the given ids (0-based row numbers) as a list
+        of dicts.
+        """
+        columns = [(name, self.column(name)) for name in self.header]
+        return [
+            {name: col.value(col.codes[row]) for name, col in columns}
+            for row in row_ids
+        ]
+
+
+def build_columnar(filename):
+    path = dataset_path(filename)
+    writer = ColumnarWriter()
+    try:
+        for _ in etl.data(writer.tee(etl.fromcsv(DatasetSource(path)))):
+            pass
+    except Exception:
+        writer.abort()
+        raise
+    writer.finish(filename, os.path.getsize(path))
+    return ColumnarDataset(filename)
+
+
+def open_columnar(filename):
+    """
+    Returns the dataset's columnar sidecar, or None when there is none
+    (or it doesn't match the data file).
+    """
+    try:
+        columnar = ColumnarDataset(filename)
+    except FileNotFoundError:
+        return None
+    if columnar.file_size != os.path.getsize(dataset_path(filename)):
+        return None
+    return columnar
+
+
+def get_columnar(filename):
+    """
+    Returns the dataset's columnar sidecar, building it first for datasets
+    written before sidecars existed.
+    """
+    return open_columnar(filename) or build_columnar(filename)
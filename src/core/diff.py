@@ -0,0 +1,102 @@
+from itertools import groupby
+from operator import itemgetter
+
+from .columnar import get_columnar
+from .sorting import get_permutation, sort_key
+
+
+def _groups(filename, dataset, key):
+    """
+    Yields `(sort_key, row_ids)` groups of a dataset in key order, read
+    from the key column's sorted permutation.
+    """
+    column = dataset.column(key)
+    permutation = get_permutation(filename, dataset, key)
+    keyed = ((sort_key(column.value(column.codes[row])), row) for row in permutation)
+    for value, rows in groupby(keyed, key=itemgetter(0)):
+        yield value, [row for _, row in rows]
+
+
+class _Diff:
+    def __init__(self, old, new, key, limit):
+        self.old = old
+        self.new = new
+        self.key = key
+        self.limit = limit
+        self.common = [col for col in old.header if col in new.header]
+        self.counts = {"added": 0, "removed": 0, "modified": 0, "unchanged": 0}
+        self.rows = {"added": [], "removed": [], "modified": []}
+
+    def _report(self, kind, item):
+        self.counts[kind] += 1
+        if len(self.rows[kind]) < self.limit:
+            self.rows[kind].append(item)
+
+    def added(self, rows):
+        for row in rows:
+            self._report("added", self.new.rows_at([row])[0])
+
+    def removed(self, rows):
+        for row in rows:
+            self._report("removed", self.old.rows_at([row])[0])
+
+    def compare(self, old_row, new_row):
+        changes = {}
+        for name in self.common:
+            old_col, new_col = self.old.column(name), self.new.column(name)
+            before = old_col.value(old_col.codes[old_row])
+            after = new_col.value(new_col.codes[new_row])
+            if before != after:
+                changes[name] = [before, after]
+        if not changes:
+            self.counts["unchanged"] += 1
+            return
+        key = self.old.column(self.key)
+        self._report(
+            "modified",
+            {"key": key.value(key.codes[old_row]), "changes": changes},
+        )
+
+
+def diff_datasets(old_name, new_name, key="name", limit=100):
+    """
+    Compares two datasets row by row, matching rows on the `key` column.
+    Both datasets are walked in key order through their sorted
+    permutations (see `sorting.get_permutation()`) in one streaming merge,
+    so it runs in linear time with memory bounded by the reported rows.
+    Rows sharing a key are paired in file order.
+    Returns the added/removed/modified/unchanged row counts, the columns
+    added or removed, and up to `limit` rows of each kind; modified rows
+    list their changed columns as `{column: [old, new]}`.
+    Raises KeyError when `key` isn't a column of both datasets.
+    """
+    old, new = get_columnar(old_name), get_columnar(new_name)
+    diff = _Diff(old, new, key, limit)
+    if old_name != new_name:
+        old_groups = _groups(old_name, old, key)
+        new_groups = _groups(new_name, new, key)
+        a, b = next(old_groups, None), next(new_groups, None)
+        while a is not None or b is not None:
+            if b is None or (a is not None and a[0] < b[0]):
+                diff.removed(a[1])
+                a = next(old_groups, None)
+            elif a is None or b[0] < a[0]:
+                diff.added(b[1])
+                b = next(new_groups, None)
+            else:
+                for old_row, new_row in zip(a[1], b[1]):
+                    diff.compare(old_row, new_row)
+                diff.removed(a[1][len(b[1]) :])
+                diff.added(b[1][len(a[1]) :])
+                a, b = next(old_groups, None), next(new_groups, None)
+    else:
+        # Same content hash: the datasets share one file.
+        new.column(key)
+        diff.counts["unchanged"] = old.row_count
+    return {
+        "key": key,
+        "columns_added": [col for col in new.header if col not in old.header],
+        "columns_removed": [col for col in old.header if col not in new.header],
+        **diff.counts,
+        "rows": diff.rows,
+    }
@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import os
+import re
+
+from django.http import HttpResponse, StreamingHttpResponse
+
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Rows rendered per chunk handed to the server.
+CHUNK_ROWS = 1000
+# Bytes read per chunk when a stored CSV file is sent as is.
+CHUNK_BYTES = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _csv_chunks(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    for number, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if number % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(header, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(header, row))) + "\n")
+        if len(lines) == CHUNK_ROWS:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+
+def stream_rows(fmt, header, rows, filename, with_header=True):
+    """
+    Returns a streaming response rendering `rows` (an iterable of tuples
+    in `header` order) as CSV or NDJSON, `CHUNK_ROWS` rows per chunk,
+    so the result is never held in memory. `with_header=False` leaves the
+    CSV header line out, for clients resuming an interrupted export.
+    """
+    if fmt == "csv":
+        chunks = _csv_chunks(header if with_header else None, rows)
+    else:
+        chunks = _ndjson_chunks(header, rows)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def _file_chunks(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(CHUNK_BYTES, length))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+
+
+def stream_file(request, path, filename):
+    """
+    Returns a streaming response sending a stored (uncompressed) CSV file
+    as is. A single `Range: bytes=start-end` request header is honoured
+    with a 206 partial response, so interrupted downloads can resume.
+    """
+    size = os.path.getsize(path)
+    start, end = 0, size - 1
+    status = 200
+    match = RANGE_RE.match(request.headers.get("Range", ""))
+    if match and any(match.groups()):
+        first, last = match.groups()
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if start > end or start >= size:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        status = 206
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _file_chunks(path, start, length), content_type="text/csv", status=status
+    )
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
@@ -0,0 +1,95 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import DownloadJob
+from .retention import apply_retention
+from .services import fetch_and_store_characters
+
+logger = logging.getLogger(__name__)
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.DOWNLOAD_JOB_WORKERS,
+                    thread_name_prefix="download-job",
+                )
+    return _executor
+
+
+def _update(job_id, **fields):
+    DownloadJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **fields)
+
+
+def run_download_job(job_id):
+    """
+    Runs the fetch -> transform -> write pipeline for the given job,
+    recording progress and the resulting `Dataset` on the job row.
+    """
+    _update(job_id, status=DownloadJob.RUNNING)
+    try:
+        ds = fetch_and_store_characters(
+            progress=lambda **counts: _update(job_id, **counts)
+        )
+    except Exception as e:
+        _update(job_id, status=DownloadJob.FAILED, error=str(e))
+    else:
+        _update(job_id, status=DownloadJob.DONE, dataset=ds)
+        if settings.RETENTION_AFTER_DOWNLOAD:
+            try:
+                apply_retention()
+            except Exception:
+                logger.exception("Applying the retention policy failed.")
+
+
+def _run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_download_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue_download():
+    """
+    Returns the download job currently in flight, or creates a new one
+    and hands it to the local worker pool.
+    Jobs with no progress for `DOWNLOAD_JOB_TIMEOUT` seconds are considered
+    abandoned (e.g. the process was restarted) and marked as failed.
+    Returns a `(job, created)` tuple.
+    """
+    while True:
+        try:
+            return _enqueue_download()
+        except IntegrityError:
+            # Another process created a job in the meantime (the database
+            # allows a single active one): join it.
+            continue
+
+
+def _enqueue_download():
+    stale_before = timezone.now() - timedelta(seconds=settings.DOWNLOAD_JOB_TIMEOUT)
+    with transaction.atomic():
+        active = DownloadJob.objects.select_for_update().filter(
+            status__in=DownloadJob.ACTIVE_STATUSES
+        )
+        active.filter(updated_at__lt=stale_before).update(
+            status=DownloadJob.FAILED, error="Job timed out."
+        )
+        job = active.order_by("created_at").first()
+        if job is not None:
+            return job, False
+        job = DownloadJob.objects.create()
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, job.pk))
+    return job, True
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import apply_retention, collect_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the datasets expired under the RETENTION_* settings along "
+        "with their files, then removes files no dataset refers to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list what would be deleted.",
+        )
+        parser.add_argument(
+            "--skip-orphans",
+            action="store_true",
+            help="Don't look for files no dataset refers to.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        prefix = "Would delete" if dry_run else "Deleted"
+        expired = apply_retention(dry_run=dry_run)
+        for ds in expired:
+            date = f"{ds.download_date:%Y-%m-%d %H:%M}"
+            self.stdout.write(f"{prefix} dataset #{ds.pk} ({date})")
+        orphans = [] if options["skip_orphans"] else collect_orphans(dry_run=dry_run)
+        for filename in orphans:
+            self.stdout.write(f"{prefix} orphaned file {filename}")
+        summary = f"{len(expired)} dataset(s) and {len(orphans)} orphaned file(s)"
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {summary}."))
@@ -0,0 +1,69 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.runner import load_latest, run_benchmarks, save_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the download, preview and aggregation services against a "
+        "local SWAPI stand-in and a synthetic dataset, and saves the results."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=10_000, help="Synthetic dataset rows."
+        )
+        parser.add_argument(
+            "--fetch-records", type=int, default=1_000, help="Fake SWAPI people."
+        )
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument(
+            "--latency", type=float, default=0.0, help="Fake SWAPI latency (s)."
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--fetch-iterations", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--no-isolate",
+            action="store_true",
+            help="Run all cases in this process (peak RSS is then cumulative).",
+        )
+        parser.add_argument(
+            "--output-dir",
+            default=os.path.join(settings.BASE_DIR, "data", "benchmarks"),
+        )
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(
+            rows=options["rows"],
+            fetch_records=options["fetch_records"],
+            page_size=options["page_size"],
+            latency=options["latency"],
+            iterations=options["iterations"],
+            fetch_iterations=options["fetch_iterations"],
+            isolate=not options["no_isolate"],
+            seed=options["seed"],
+        )
+        path = save_results(results, options["output_dir"])
+        previous = load_latest(options["output_dir"], exclude=path)
+        previous_cases = previous["cases"] if previous else {}
+
+        self.stdout.write(
+            f"{'case':<16}{'p50 ms':>10}{'p99 ms':>10}{'rows/s':>14}"
+            f"{'peak RSS MB':>13}{'p50 vs last':>13}"
+        )
+        for name, case in results["cases"].items():
+            rss = case["peak_rss_bytes"]
+            change = ""
+            if name in previous_cases and previous_cases[name]["p50_ms"]:
+                ratio = case["p50_ms"] / previous_cases[name]["p50_ms"] - 1
+                change = f"{ratio:+.1%}"
+            self.stdout.write(
+                f"{name:<16}{case['p50_ms']:>10.2f}{case['p99_ms']:>10.2f}"
+                f"{case['rows_per_second'] or 0:>14,.0f}"
+                f"{rss / 2**20 if rss else 0:>13.1f}{change:>13}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {path}"))
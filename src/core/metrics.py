@@ -0,0 +1,205 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger("core.metrics")
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter, optionally split by labels.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {value}"]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values (durations, sizes) in cumulative
+    buckets, with their count and sum.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts, total, count = self._values[key]
+            index = bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self._values[key] = [counts, total + value, count + 1]
+
+    def count(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), [None, 0.0, 0])[2]
+
+    def _samples(self, key, value):
+        counts, total, count = value
+        names = self.label_names + ("le",)
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(
+                f"{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}"
+            )
+        lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics of this process, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = Histogram(
+    "core_stage_seconds", "Duration of service stages.", labels=("stage",)
+)
+SWAPI_REQUESTS = Counter(
+    "core_swapi_requests_total", "SWAPI requests made.", labels=("outcome",)
+)
+SWAPI_REQUEST_SECONDS = Histogram(
+    "core_swapi_request_seconds", "Duration of SWAPI requests."
+)
+SWAPI_PAGES = Counter("core_swapi_pages_total", "SWAPI collection pages fetched.")
+PLANET_LOOKUPS = Counter(
+    "core_planet_lookups_total",
+    "Homeworld resolutions by planet cache outcome.",
+    labels=("result",),
+)
+ROWS_WRITTEN = Counter("core_rows_written_total", "Dataset rows written.")
+BYTES_WRITTEN = Counter("core_bytes_written_total", "Dataset bytes stored.")
+BYTES_READ = Counter(
+    "core_bytes_read_total", "Dataset file bytes read by CSV scans and seeks."
+)
+ROWS_SCANNED = Counter(
+    "core_rows_scanned_total",
+    "Rows read to answer previews and aggregations.",
+    labels=("operation", "source"),
+)
+AGGREGATION_CACHE = Counter(
+    "core_aggregation_cache_requests_total",
+    "Aggregation cache lookups.",
+    labels=("result",),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "core_http_request_seconds",
+    "Duration of HTTP requests by view.",
+    labels=("view", "method", "status"),
+)
+
+
+@contextmanager
+def span(stage, level=logging.DEBUG, **fields):
+    """
+    Times a stage of work: the duration is added to `core_stage_seconds`
+    and logged as a structured `span` event along with `fields`. The
+    yielded dict can be updated to log more fields (row counts...).
+    """
+    fields = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        logger.log(
+            level,
+            "span",
+            extra={"event": {"stage": stage, "seconds": round(elapsed, 6), **fields}},
+        )
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as one JSON object per line, merging the `event`
+    fields passed through `extra`.
+    """
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "event", {}),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
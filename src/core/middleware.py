@@ -0,0 +1,153 @@
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import HTTP_REQUEST_SECONDS
+
+logger = logging.getLogger("core.requests")
+profile_logger = logging.getLogger("core.profile")
+
+# Only one request is profiled at a time: tracemalloc is process-wide,
+# concurrent requests are served unprofiled.
+_profiling = threading.Lock()
+
+# Profiler of the async request being handled, see `profile_blocking()`.
+_current_profiler = ContextVar("current_profiler", default=None)
+
+
+def _wants_profile(request):
+    if settings.REQUEST_PROFILING:
+        return True
+    return settings.REQUEST_PROFILING_HEADER and "HTTP_X_PROFILE" in request.META
+
+
+def profile_blocking(func):
+    """
+    Returns `func` wrapped to run under the profiler of the current async
+    request, if it is profiled. Async views do their work on executor
+    threads (see `views._run_blocking()`), which a profiler enabled on the
+    event loop thread would miss, while catching other requests'
+    coroutines instead.
+    """
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return func
+
+    def profiled(*args, **kwargs):
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+
+    return profiled
+
+
+@contextmanager
+def _profiled(request, is_async=False):
+    """
+    Profiles the wrapped request with cProfile and tracemalloc and logs
+    the top functions by cumulative time and the peak traced memory.
+    A sync request is profiled on its thread; for an async one, only the
+    blocking work handed to `profile_blocking()` is (the streaming of a
+    response's body happens later and isn't).
+    """
+    if not _wants_profile(request) or not _profiling.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    if is_async:
+        token = _current_profiler.set(profiler)
+    else:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if is_async:
+            _current_profiler.reset(token)
+        else:
+            profiler.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        _profiling.release()
+        out = io.StringIO()
+        if profiler.getstats():
+            stats = pstats.Stats(profiler, stream=out).sort_stats("cumulative")
+            stats.print_stats(settings.REQUEST_PROFILING_TOP)
+        profile_logger.info(
+            "profile",
+            extra={
+                "event": {
+                    "path": request.path,
+                    "peak_traced_bytes": peak,
+                    "stats": out.getvalue(),
+                }
+            },
+        )
+
+
+class MetricsMiddleware:
+    """
+    Times every request into `core_http_request_seconds` (labelled by URL
+    name, method and status) and logs it as a structured `request` event.
+    Requests are profiled when `REQUEST_PROFILING` is set, or when they
+    carry an `X-Profile` header and `REQUEST_PROFILING_HEADER` is set.
+    Works for both sync and async request handling.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with _profiled(request):
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with _profiled(request, is_async=True):
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started)
+        return response
+
+    def _record(self, request, response, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(
+            elapsed, view=view, method=request.method, status=response.status_code
+        )
+        logger.debug(
+            "request",
+            extra={
+                "event": {
+                    "view": view,
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "seconds": round(elapsed, 6),
+                }
+            },
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Planet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("url", models.URLField(max_length=255, unique=True)),
+                ("name", models.CharField(max_length=255)),
+                ("fetched_at", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_downloadjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="columns",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="row_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_dataset_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="source_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="source_edited",
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="source_etag",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="source_last_modified",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_dataset_source_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="sha256",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="size",
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
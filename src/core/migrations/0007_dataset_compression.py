@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_dataset_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="compression",
+            field=models.CharField(blank=True, max_length=8),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_dataset_compression"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="dataset",
+            index=models.Index(
+                fields=["-download_date", "-id"], name="dataset_listing_idx"
+            ),
+        ),
+    ]
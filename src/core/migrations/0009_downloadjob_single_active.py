@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    # Keeps the oldest job in flight, as `enqueue_download()` would join it.
+    DownloadJob = apps.get_model("core", "DownloadJob")
+    active = DownloadJob.objects.filter(status__in=("pending", "running"))
+    oldest = active.order_by("created_at").first()
+    if oldest is not None:
+        active.exclude(pk=oldest.pk).update(
+            status="failed", error="Superseded by another job."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_dataset_listing_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="downloadjob",
+            constraint=models.UniqueConstraint(
+                models.Value(True),
+                condition=models.Q(("status__in", ("pending", "running"))),
+                name="single_active_download_job",
+            ),
+        ),
+    ]
@@ -1,9 +1,93 @@
 from django.db import models
 
+from .storage import blob_name
+
 
 class Dataset(models.Model):
     filename = models.CharField(max_length=255)
     download_date = models.DateTimeField()
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    compression = models.CharField(max_length=8, blank=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    row_count = models.PositiveIntegerField(null=True, blank=True)
+    columns = models.JSONField(default=list, blank=True)
+    source_count = models.PositiveIntegerField(null=True, blank=True)
+    source_edited = models.CharField(max_length=32, blank=True)
+    source_etag = models.CharField(max_length=255, blank=True)
+    source_last_modified = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            # Backs the newest-first keyset pagination of the index page.
+            models.Index(fields=["-download_date", "-id"], name="dataset_listing_idx"),
+        ]
 
     def __str__(self):
         return self.filename
+
+    @property
+    def storage_name(self):
+        """
+        Name of the data file under the data directory: content-addressed
+        for datasets with a hash, the plain filename for older ones.
+        """
+        if self.sha256:
+            return blob_name(self.sha256, self.compression)
+        return self.filename
+
+    def storage_users(self):
+        """
+        Returns the datasets stored in the same data file as this one.
+        """
+        if self.sha256:
+            return Dataset.objects.filter(
+                sha256=self.sha256, compression=self.compression
+            )
+        return Dataset.objects.filter(sha256="", filename=self.filename)
+
+
+class Planet(models.Model):
+    url = models.URLField(max_length=255, unique=True)
+    name = models.CharField(max_length=255)
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.name
+
+
+class DownloadJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+    ACTIVE_STATUSES = (PENDING, RUNNING)
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    pages_fetched = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    dataset = models.ForeignKey(
+        Dataset, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # At most one job in flight, across processes: a unique index on
+            # a constant, restricted to the active rows.
+            models.UniqueConstraint(
+                models.Value(True),
+                condition=models.Q(status__in=("pending", "running")),
+                name="single_active_download_job",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Download #{self.pk} ({self.status})"
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import PLANET_LOOKUPS
+from .models import Planet
+from .swapi import get_client
+
+
+class PlanetResolver:
+    """
+    Resolves homeworld URLs to planet names.
+    Names are persisted in the `Planet` table so they survive across
+    downloads; entries older than `PLANET_CACHE_TTL` seconds are treated
+    as expired and fetched again on first use.
+    A failed lookup falls back to the last known name (expired or not),
+    else the URL itself, and is not retried by the same resolver.
+    """
+
+    def __init__(self, client=None, ttl=None):
+        self.client = client or get_client()
+        ttl = settings.PLANET_CACHE_TTL if ttl is None else ttl
+        cutoff = timezone.now() - timedelta(seconds=ttl)
+        self._known = {}
+        self._names = {}
+        for url, name, fetched_at in Planet.objects.values_list(
+            "url", "name", "fetched_at"
+        ):
+            self._known[url] = name
+            if fetched_at >= cutoff:
+                self._names[url] = name
+        self._failed = {}
+        self._refreshed = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, url, fresh=False):
+        """
+        Returns the planet name of `url`. With `fresh`, a cached name is
+        fetched again (at most once per resolver) even if not expired yet.
+        """
+        if not url:
+            return ""
+        if url in self._failed:
+            PLANET_LOOKUPS.inc(result="failed")
+            return self._failed[url]
+        name = self._names.get(url)
+        if fresh and url not in self._refreshed:
+            self._refreshed.add(url)
+            name = None
+        if name is not None:
+            self.hits += 1
+            PLANET_LOOKUPS.inc(result="hit")
+            return name
+        self.misses += 1
+        PLANET_LOOKUPS.inc(result="miss")
+        try:
+            name = self.client.get_json(url).get("name", url)
+        except Exception:
+            self._failed[url] = self._known.get(url, url)
+            return self._failed[url]
+        Planet.objects.update_or_create(
+            url=url, defaults={"name": name, "fetched_at": timezone.now()}
+        )
+        self._names[url] = self._known[url] = name
+        return name
+
+    @property
+    def is_cold(self):
+        return not self._names
+
+    def prefetch(self, planets_url):
+        """
+        Warms the cache with a single paged pass over the planets collection
+        instead of resolving planets one by one.
+        """
+        now = timezone.now()
+        planets = [
+            Planet(url=p["url"], name=p.get("name", p["url"]), fetched_at=now)
+            for p in self.client.fetch_collection(planets_url)
+            if p.get("url")
+        ]
+        Planet.objects.bulk_create(
+            planets,
+            update_conflicts=True,
+            unique_fields=["url"],
+            update_fields=["name", "fetched_at"],
+        )
+        self._names.update((p.url, p.name) for p in planets)
+        self._known.update(self._names)
@@ -0,0 +1,91 @@
+import json
+import os
+
+from .columnar import get_columnar
+from .storage import sidecar_path, write_atomic
+
+PROFILE = "profile"
+
+# Frequency tables of columns whose values are mostly unique (more than
+# TABLE_MAX_DISTINCT_RATIO of the rows distinct, past TABLE_MIN_ENTRIES
+# entries) aren't written: they would be about as large as the column
+# itself, and counting it is just as fast.
+TABLE_MAX_DISTINCT_RATIO = 0.5
+TABLE_MIN_ENTRIES = 1024
+
+
+def _write_json(path, data):
+    write_atomic(path, lambda f: f.write(json.dumps(data).encode()))
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _wants_table(frequencies, row_count):
+    return frequencies is not None and (
+        len(frequencies) <= TABLE_MIN_ENTRIES
+        or len(frequencies) <= row_count * TABLE_MAX_DISTINCT_RATIO
+    )
+
+
+def save_profile(filename, profile):
+    """
+    Stores a dataset profile as a sidecar: a summary (row count, column
+    names, per-column distinct counts) plus one frequency table per column,
+    so answering a single-column count reads just that column's table.
+    Columns without a table (mostly unique ones, and spilled ones which
+    have no distinct count either, see `ColumnarWriter`) are counted by
+    the aggregation engine instead.
+    The summary is written last and marks the profile as complete.
+    """
+    directory = sidecar_path(filename, PROFILE)
+    names = list(profile["columns"])
+    for number, name in enumerate(names):
+        frequencies = profile["columns"][name]
+        if _wants_table(frequencies, profile["row_count"]):
+            _write_json(os.path.join(directory, f"{number}.json"), frequencies)
+    _write_json(
+        os.path.join(directory, "summary.json"),
+        {
+            "row_count": profile["row_count"],
+            "columns": names,
+            "distinct": {
+                name: None if freqs is None else len(freqs)
+                for name, freqs in profile["columns"].items()
+            },
+        },
+    )
+
+
+def load_summary(filename):
+    return _read_json(os.path.join(sidecar_path(filename, PROFILE), "summary.json"))
+
+
+def get_summary(filename):
+    """
+    Returns the profile summary of a dataset, profiling it first for
+    datasets written before profiles existed.
+    """
+    summary = load_summary(filename)
+    if summary is None:
+        save_profile(filename, get_columnar(filename).profile())
+        summary = load_summary(filename)
+    return summary
+
+
+def load_frequencies(filename, column):
+    """
+    Returns the precomputed `[value, count]` table of a column, most
+    frequent first, or None when the dataset has no profile or the column
+    no table.
+    """
+    summary = load_summary(filename)
+    if summary is None or column not in summary["columns"]:
+        return None
+    number = summary["columns"].index(column)
+    return _read_json(os.path.join(sidecar_path(filename, PROFILE), f"{number}.json"))
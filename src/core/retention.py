@@ -0,0 +1,183 @@
+import os
+import shutil
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Dataset
+from .storage import (
+    data_dir,
+    dataset_path,
+    delete_blob,
+    is_dataset_file,
+    sidecar_dir,
+)
+
+
+def _file_size(ds):
+    if ds.size is not None:
+        return ds.size
+    path = dataset_path(ds.storage_name)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _dir_size(directory):
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def _stored_size(ds):
+    """
+    Returns the disk space taken by a dataset's data file and artifacts
+    (row index, columnar sidecar, postings...).
+    """
+    return _file_size(ds) + _dir_size(sidecar_dir(ds.storage_name))
+
+
+def select_expired(
+    datasets, now, keep_last=0, daily_after=0, weekly_after=0, max_bytes=0
+):
+    """
+    Returns the datasets to delete under the retention rules:
+    - the `keep_last` newest datasets (and always the newest one) are kept,
+    - datasets older than `daily_after` days are thinned to the newest one
+      of each day, those older than `weekly_after` days to the newest one
+      of each ISO week,
+    - then the oldest remaining ones are dropped while their data files
+      and artifacts take more than `max_bytes` (a file shared by several
+      datasets counts once).
+    A rule set to 0 is off.
+    """
+    ordered = sorted(datasets, key=lambda ds: (ds.download_date, ds.pk), reverse=True)
+    protected = {ds.pk for ds in ordered[: max(keep_last, 1)]}
+    kept = []
+    expired = []
+    periods = set()
+    for ds in ordered:
+        age = now - ds.download_date
+        day = timezone.localtime(ds.download_date).date()
+        period = None
+        if weekly_after and age > timedelta(days=weekly_after):
+            period = ("week", *day.isocalendar()[:2])
+        elif daily_after and age > timedelta(days=daily_after):
+            period = ("day", day)
+        if ds.pk not in protected and period is not None and period in periods:
+            expired.append(ds)
+        else:
+            if period is not None:
+                periods.add(period)
+            kept.append(ds)
+
+    if max_bytes:
+        users = Counter(ds.storage_name for ds in kept)
+        sizes = {ds.storage_name: _stored_size(ds) for ds in kept}
+        total = sum(sizes.values())
+        for ds in reversed(kept):
+            if total <= max_bytes or ds.pk in protected:
+                break
+            expired.append(ds)
+            users[ds.storage_name] -= 1
+            if not users[ds.storage_name]:
+                total -= sizes[ds.storage_name]
+    return expired
+
+
+def apply_retention(now=None, dry_run=False):
+    """
+    Deletes the datasets expired under the `RETENTION_*` settings (see
+    `select_expired()`); their files and artifacts are removed along with
+    them unless other datasets share them. Returns the expired datasets.
+    """
+    datasets = Dataset.objects.only(
+        "pk", "filename", "download_date", "sha256", "compression", "size"
+    )
+    expired = select_expired(
+        list(datasets),
+        now or timezone.now(),
+        keep_last=settings.RETENTION_KEEP_LAST,
+        daily_after=settings.RETENTION_DAILY_AFTER_DAYS,
+        weekly_after=settings.RETENTION_WEEKLY_AFTER_DAYS,
+        max_bytes=settings.RETENTION_MAX_BYTES,
+    )
+    if expired and not dry_run:
+        Dataset.objects.filter(pk__in=[ds.pk for ds in expired]).delete()
+    return expired
+
+
+def _is_stale(path, cutoff):
+    try:
+        return os.path.getmtime(path) < cutoff
+    except FileNotFoundError:
+        return False
+
+
+def collect_orphans(dry_run=False, grace=None):
+    """
+    Removes the dataset files and artifact directories no dataset refers
+    to, as well as leftover staging files and trash. Only files older than
+    `grace` seconds (default `RETENTION_ORPHAN_GRACE`) are touched, so those
+    of downloads in progress are left alone.
+    Returns the storage names of the removed datasets files and artifacts.
+    """
+    root = data_dir()
+    if not os.path.isdir(root):
+        return []
+    grace = settings.RETENTION_ORPHAN_GRACE if grace is None else grace
+    cutoff = time.time() - grace
+    referenced = {
+        ds.storage_name
+        for ds in Dataset.objects.only("filename", "sha256", "compression")
+    }
+    orphans = []
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for name in filenames:
+            filename = os.path.relpath(os.path.join(dirpath, name), root)
+            if (
+                is_dataset_file(filename)
+                and filename not in referenced
+                and _is_stale(os.path.join(dirpath, name), cutoff)
+            ):
+                orphans.append(filename)
+
+    sidecars = os.path.join(root, ".sidecars")
+    for dirpath, dirnames, _ in os.walk(sidecars):
+        filename = os.path.relpath(dirpath, sidecars)
+        if not is_dataset_file(filename):
+            continue
+        dirnames[:] = []
+        if (
+            filename not in referenced
+            and filename not in orphans
+            and not os.path.exists(dataset_path(filename))
+            and _is_stale(dirpath, cutoff)
+        ):
+            orphans.append(filename)
+
+    if dry_run:
+        return orphans
+    for filename in orphans:
+        delete_blob(filename)
+    for leftovers in (".staging", ".trash"):
+        directory = os.path.join(root, leftovers)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not _is_stale(path, cutoff):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+    return orphans
@@ -0,0 +1,208 @@
+import heapq
+import math
+import os
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .columnar import _map, get_columnar
+from .storage import sidecar_path, write_atomic
+
+POSTINGS = "postings"
+
+# Lookup operators of the search query string (`<column>__<op>=<value>`),
+# plain `<column>=<value>` being an equality test.
+OPERATORS = ("eq", "prefix", "gt", "gte", "lt", "lte")
+NUMERIC_OPERATORS = {
+    "gt": lambda x, bound: x > bound,
+    "gte": lambda x, bound: x >= bound,
+    "lt": lambda x, bound: x < bound,
+    "lte": lambda x, bound: x <= bound,
+}
+
+
+def to_number(value):
+    """
+    Parses a SWAPI numeric value ("172", "1,358", "19BBY"), None when it
+    isn't one ("unknown", "n/a", and "nan" or "inf", which would break
+    the ordering of numbers). Birth years count years before the battle of
+    Yavin, so "19BBY" is 19 and "4ABY" is -4.
+    """
+    value = value.replace(",", "").strip()
+    sign = 1
+    if value.endswith("BBY"):
+        value = value[:-3]
+    elif value.endswith("ABY"):
+        value, sign = value[:-3], -1
+    try:
+        number = float(value) * sign
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+class Postings:
+    """
+    Inverted index of one column: the ids of the rows holding each value,
+    grouped by value code. Stored as two files:
+    - `<n>.rows`: unsigned 32-bit row ids, ascending within each code,
+    - `<n>.starts`: unsigned 64-bit start of each code's ids in `.rows`
+      (plus the total row count).
+    """
+
+    def __init__(self, directory, number):
+        self.rows = _map(os.path.join(directory, f"{number}.rows"), "I")
+        self.starts = _map(os.path.join(directory, f"{number}.starts"), "Q")
+
+    def __getitem__(self, code):
+        return self.rows[self.starts[code] : self.starts[code + 1]]
+
+
+def _build_postings(column, directory, number):
+    codes = column.codes
+    cardinality = column.cardinality
+    if np is not None:
+        keys = np.frombuffer(codes, dtype=np.uint32)
+        rows = np.argsort(keys, kind="stable").astype(np.uint32)
+        starts = np.zeros(cardinality + 1, dtype=np.uint64)
+        np.cumsum(np.bincount(keys, minlength=cardinality), out=starts[1:])
+    else:
+        starts = array("Q", bytes(8 * (cardinality + 1)))
+        for code in codes:
+            starts[code + 1] += 1
+        for code in range(cardinality):
+            starts[code + 1] += starts[code]
+        positions = starts[:-1]
+        rows = array("I", bytes(4 * len(codes)))
+        for row, code in enumerate(codes):
+            rows[positions[code]] = row
+            positions[code] += 1
+    write_atomic(os.path.join(directory, f"{number}.rows"), rows.tofile)
+    write_atomic(os.path.join(directory, f"{number}.starts"), starts.tofile)
+
+
+def build_postings(filename):
+    """
+    Builds the inverted index of every column of a dataset from its
+    columnar sidecar.
+    """
+    dataset = get_columnar(filename)
+    directory = sidecar_path(filename, POSTINGS)
+    for number, name in enumerate(dataset.header):
+        _build_postings(dataset.column(name), directory, number)
+
+
+def get_postings(filename, dataset, name):
+    """
+    Returns the inverted index of column `name`, building it first for
+    datasets written before indexes existed (or when it doesn't match the
+    columnar sidecar).
+    """
+    column = dataset.column(name)
+    directory = sidecar_path(filename, POSTINGS)
+    number = dataset.header.index(name)
+    try:
+        postings = Postings(directory, number)
+        if len(postings.starts) == column.cardinality + 1 and (
+            postings.starts[-1] == dataset.row_count
+        ):
+            return postings
+    except FileNotFoundError:
+        pass
+    _build_postings(column, directory, number)
+    return Postings(directory, number)
+
+
+def parse_filters(params):
+    """
+    Turns query string items (`(key, [values])` pairs) into
+    `(column, op, values)` filters, e.g. `homeworld=Tatooine`,
+    `name__prefix=Lu` or `height__gte=150`. Several values of an
+    equality or prefix test match any of them.
+    Raises ValueError on an unknown operator or a non-numeric bound.
+    """
+    filters = []
+    for key, values in params:
+        column, _, op = key.partition("__")
+        op = op or "eq"
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+        if op in NUMERIC_OPERATORS:
+            bounds = [to_number(value) for value in values]
+            if None in bounds:
+                raise ValueError(f"Not a number: {key}={values}")
+            values = bounds
+        filters.append((column, op, values))
+    return filters
+
+
+def _matches(value, op, values):
+    if op == "eq":
+        return value in values
+    if op == "prefix":
+        return value.startswith(tuple(values))
+    number = to_number(value)
+    return number is not None and all(
+        NUMERIC_OPERATORS[op](number, bound) for bound in values
+    )
+
+
+def _union(postings):
+    """
+    Merges the (disjoint, ascending) row ids of several values.
+    """
+    if len(postings) == 1:
+        return postings[0]
+    if np is not None:
+        if not postings:
+            return np.zeros(0, dtype=np.uint32)
+        return np.sort(np.concatenate([np.frombuffer(p, np.uint32) for p in postings]))
+    return array("I", heapq.merge(*postings))
+
+
+def _intersection(matches):
+    matches = sorted(matches, key=len)
+    if np is not None:
+        result = np.frombuffer(matches[0], np.uint32)
+        for other in matches[1:]:
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+    others = [set(other) for other in matches[1:]]
+    return array("I", (row for row in matches[0] if all(row in s for s in others)))
+
+
+def search_rows(filename, filters, offset=0, limit=10):
+    """
+    Returns the rows of a dataset matching all `filters` (see
+    `parse_filters()`): their total count and, from match `offset` on,
+    `limit` row ids and rows.
+    Each filter is answered from the column's inverted index: values are
+    tested once per distinct value and the row ids of matching values
+    merged, then the filters are intersected, so the CSV is never scanned.
+    Raises KeyError for an unknown column.
+    """
+    dataset = get_columnar(filename)
+    if filters:
+        matches = []
+        for column_name, op, values in filters:
+            column = dataset.column(column_name)
+            postings = get_postings(filename, dataset, column_name)
+            matches.append(
+                _union(
+                    [
+                        postings[code]
+                        for code in range(column.cardinality)
+                        if _matches(column.value(code), op, values)
+                    ]
+                )
+            )
+        row_ids = _intersection(matches)
+        total = len(row_ids)
+        page = [int(row) for row in row_ids[offset : offset + limit]]
+    else:
+        total = dataset.row_count
+        page = list(range(offset, min(offset + limit, total)))
+    return {"total": total, "row_ids": page, "rows": dataset.rows_at(page)}
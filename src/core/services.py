@@ -1,39 +1,169 @@
+import json
+import logging
 import os
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
 import petl as etl
-import requests
 from django.utils import timezone
 from django.conf import settings
+from petl.util.base import Table
+
+from .aggregation import (
+    count_combinations,
+    count_combinations_parallel,
+    count_combinations_petl,
+)
+from .cache import aggregation_cache
+from .columnar import ColumnarWriter, get_columnar, open_columnar
+from .metrics import (
+    BYTES_WRITTEN,
+    ROWS_SCANNED,
+    ROWS_WRITTEN,
+    SWAPI_PAGES,
+    span,
+)
 from .models import Dataset
+from .planets import PlanetResolver
+from .profiles import get_summary, load_frequencies, save_profile
+from .search import build_postings
+from .sorting import sorted_rows
+from .storage import (
+    DatasetSource,
+    HashingSource,
+    blob_name,
+    data_dir,
+    dataset_path,
+    get_row_index,
+    staging_path,
+    store_blob,
+    using_data_dir,
+)
+from .swapi import get_client
+from .workers import get_pool, reset_pool
+
+
+class RecordsView(Table):
+    """
+    petl view over an iterable of SWAPI records (dicts), with the header
+    taken from the first record. Unlike `etl.fromdicts`, nothing is buffered
+    or cached, so a generator of records is streamed through in one pass.
+    """
+
+    def __init__(self, records):
+        self.records = records
+
+    def __iter__(self):
+        it = iter(self.records)
+        first = next(it, None)
+        if first is None:
+            yield ()
+            return
+        header = tuple(first)
+        yield header
+        yield tuple(first.get(f) for f in header)
+        for rec in it:
+            yield tuple(rec.get(f) for f in header)
+
+
+def _stream_records(pages, progress):
+    rows = 0
+    for number, page in enumerate(pages, 1):
+        SWAPI_PAGES.inc()
+        progress(pages_fetched=number, rows_written=rows)
+        results = page.get("results", [])
+        yield from results
+        rows += len(results)
+    progress(rows_written=rows)
+
+
+def _edited_after(since):
+    """
+    Returns a predicate flagging the records edited after `since`.
+    """
+
+    def is_changed(rec):
+        return rec.get("edited", "") > since
+
+    return is_changed
+
+
+def _may_be_unchanged(first, latest):
+    """
+    Tells from the first page whether the source may still match the
+    `latest` dataset: same record count, and none of its records edited
+    since.
+    """
+    return (
+        latest is not None
+        and first.get("count") == latest.source_count
+        and all(
+            rec.get("edited", "") <= latest.source_edited
+            for rec in first.get("results", [])
+        )
+    )
+
+
+def _spool_records(records, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for rec in records:
+            f.write(json.dumps(rec))
+            f.write("\n")
+
+
+def _read_spooled(path):
+    with open(path) as f:
+        for line in f:
+            yield json.loads(line)
 
 
-def transform_data(records):
+class _SourceState:
+    """
+    Tracks the upstream state of a download while its records stream by:
+    the record count and the latest `edited` timestamp.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.max_edited = ""
+
+    def track(self, records):
+        for rec in records:
+            self.count += 1
+            self.max_edited = max(self.max_edited, rec.get("edited") or "")
+            yield rec
+
+    def matches(self, ds):
+        return (
+            ds is not None
+            and ds.source_count == self.count
+            and ds.source_edited == self.max_edited
+        )
+
+
+def transform_data(records, resolve_planet=None, is_changed=None):
     """
     Cleans and preprocesses Star Wars character data:
     - Adds `date` column based on `edited` field in format YYYY-MM-DD,
-    - Resolves `homeworld` URLs to planet names with caching to avoid unnecessary fetches,
+    - Resolves `homeworld` URLs to planet names with the persistent planet
+      cache to avoid unnecessary fetches; when `is_changed` is given, the
+      homeworlds of records it flags are resolved afresh,
     - Drops fields: films, species, vehicles, starships, created, edited.
     """
-    table = etl.fromdicts(records)
+    if resolve_planet is None:
+        resolve_planet = PlanetResolver()
+    table = RecordsView(records)
     table = etl.addfield(table, "date", lambda rec: rec.get("edited", "")[:10])
-    planet_cache = {}
-
-    def get_planet_name(url):
-        if not url:
-            return ""
-        if url in planet_cache:
-            return planet_cache[url]
-        try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            name = resp.json().get("name", url)
-        except Exception:
-            name = url
-        planet_cache[url] = name
-        return name
-
-    table = etl.convert(table, "homeworld", get_planet_name)
+    if is_changed is None:
+        table = etl.convert(table, "homeworld", resolve_planet)
+    else:
+        table = etl.convert(
+            table,
+            "homeworld",
+            lambda url, rec: resolve_planet(url, fresh=is_changed(rec)),
+            pass_row=True,
+        )
     table = etl.cutout(
         table,
         "films",
@@ -47,61 +177,327 @@ def transform_data(records):
     return table
 
 
-def fetch_and_store_characters():
+def fetch_and_store_characters(progress=None):
     """
     Fetches full dataset of Star Wars characters from SWAPI,
     cleans and preprocesses data, saves to CSV and records metadata.
+    `progress`, if given, is called with `pages_fetched` and `rows_written`
+    keyword arguments as the download advances.
+    Returns the created `Dataset`.
+    Pages are streamed through the petl pipeline and written as they
+    arrive, so memory stays bounded by the pages in flight, the planet
+    cache and the columnar dictionaries (at most `COLUMNAR_MAX_DISTINCT`
+    values per column) regardless of the collection size.
+    The file is hashed as it is written and stored by content, so a
+    byte-identical download reuses the stored file and its artifacts;
+    it is compressed in seekable blocks when `DATASET_COMPRESSION` is set.
+    With `SWAPI_INCREMENTAL_REFRESH`, the upstream state is compared with
+    the latest dataset: a 304 to a conditional request, or the same record
+    count and latest `edited` timestamp, returns the latest dataset instead
+    of storing a copy, and only records edited since it get their
+    homeworld resolved afresh. When the first page can't tell the source
+    changed, the raw records are spooled to disk while the rest is
+    checked, so an unchanged source is neither transformed nor written.
     """
+    progress = progress or (lambda **counts: None)
     base_url = os.environ.get("SWAPI_URL", "http://swapi:12345/api")
-    url = f"{base_url}/people/"
-    all_characters = []
-
-    while url:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        data = resp.json()
-        all_characters.extend(data.get("results", []))
-        url = data.get("next")
-
-    table = transform_data(all_characters)
-    data_dir = os.path.join(settings.BASE_DIR, "data", "characters")
-    os.makedirs(data_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"swapi_characters_{timestamp}.csv"
+    people_url = f"{base_url}/people/"
+    client = get_client()
+
+    latest = None
+    if settings.SWAPI_INCREMENTAL_REFRESH:
+        latest = (
+            Dataset.objects.exclude(source_count=None)
+            .order_by("-download_date")
+            .first()
+        )
+    with span("swapi_first_page") as fields:
+        first, validators = client.get_first_page(
+            people_url,
+            etag=latest.source_etag if latest else "",
+            last_modified=latest.source_last_modified if latest else "",
+        )
+        fields["not_modified"] = first is None
+    if first is None:
+        progress(pages_fetched=1, rows_written=latest.row_count or 0)
+        return latest
 
-    file_path = os.path.join(data_dir, filename)
-    etl.tocsv(table, file_path)
+    source = _SourceState()
+    pages = client.iter_pages(people_url, first=first)
+    records = source.track(_stream_records(pages, progress))
+    spool = None
+    if _may_be_unchanged(first, latest):
+        # Only the raw records are kept while checking the whole source.
+        spool = staging_path()
+        with span("swapi_check_unchanged") as fields:
+            _spool_records(records, spool)
+            fields["unchanged"] = source.matches(latest)
+        if source.matches(latest):
+            os.remove(spool)
+            return latest
+        records = _read_spooled(spool)
 
-    ds = Dataset(filename=filename, download_date=timezone.now())
+    try:
+        resolver = PlanetResolver()
+        if settings.SWAPI_PREFETCH_PLANETS and resolver.is_cold:
+            with span("planet_prefetch"):
+                resolver.prefetch(f"{base_url}/planets/")
+        is_changed = None
+        if latest and latest.source_edited:
+            is_changed = _edited_after(latest.source_edited)
+        table = transform_data(records, resolver, is_changed)
+
+        with span("download", level=logging.INFO) as fields:
+            ds = store_table(table)
+            fields.update(
+                records=source.count,
+                planet_hits=resolver.hits,
+                planet_misses=resolver.misses,
+            )
+    finally:
+        if spool is not None and os.path.exists(spool):
+            os.remove(spool)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ds.filename = f"swapi_characters_{timestamp}.csv"
+    ds.download_date = timezone.now()
+    ds.source_count = source.count
+    ds.source_edited = source.max_edited
+    ds.source_etag = validators["etag"]
+    ds.source_last_modified = validators["last_modified"]
     ds.save()
-    return filename
+    return ds
 
 
-def load_dataset_preview(filename, offset=0, limit=10):
+def store_table(table):
+    """
+    Writes a petl table as a dataset file, stored by content hash (and
+    compressed per `DATASET_COMPRESSION`) along with its row index,
+    columnar sidecar, profile and inverted indexes.
+    Returns an unsaved `Dataset` with the storage fields filled in.
+    The CSV write is timed as the `write_csv` stage; as the table streams,
+    it includes the upstream work (SWAPI paging, planet resolution, petl
+    transformation) pulled through it.
+    """
+    tmp_path = staging_path()
+    sink = HashingSource(
+        tmp_path, settings.DATASET_COMPRESSION, settings.DATASET_INDEX_INTERVAL
+    )
+    columnar = ColumnarWriter()
+    try:
+        with span("write_csv") as fields:
+            etl.tocsv(columnar.tee(table), sink)
+            fields.update(rows=columnar.row_count, bytes=sink.size)
+        storage_name = blob_name(sink.sha256.hexdigest(), settings.DATASET_COMPRESSION)
+        with span("store_blob", name=storage_name):
+            created = store_blob(tmp_path, storage_name, sink.index)
+    except Exception:
+        columnar.abort()
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    size = os.path.getsize(dataset_path(storage_name))
+    if created:
+        with span("build_artifacts"):
+            columnar.finish(storage_name, size)
+            save_profile(storage_name, columnar.profile())
+            build_postings(storage_name)
+        ROWS_WRITTEN.inc(columnar.row_count)
+        BYTES_WRITTEN.inc(size)
+    else:
+        columnar.abort()
+    summary = get_summary(storage_name)
+    return Dataset(
+        sha256=sink.sha256.hexdigest(),
+        compression=settings.DATASET_COMPRESSION,
+        size=size,
+        row_count=summary["row_count"],
+        columns=summary["columns"],
+    )
+
+
+def load_dataset_preview(filename, offset=0, limit=10, sort=""):
     """
     Loads a portion of data from a CSV file: returns `limit`
     rows starting from row `offset` (0-based).
+    With `sort` (a column name, "-" prefixed for descending order), rows
+    are ordered by that column, see `sorting.sorted_rows()`.
+    Rows are decoded straight from the columnar sidecar when there is one,
+    otherwise the row index is used to seek next to `offset`, so only the
+    rows of the requested page (plus at most one index interval) are parsed
+    (and decompressed, for compressed files).
     Returns a list of dictionaries (each record is a dict column>value).
     """
-    data_dir = os.path.join(settings.BASE_DIR, "data", "characters")
-    path = os.path.join(data_dir, filename)
-    table = etl.fromcsv(path)
-    if offset == 0:
-        subset = etl.head(table, limit)
+    with span("preview", name=filename, offset=offset, limit=limit) as fields:
+        if sort:
+            rows, source = sorted_rows(filename, sort, offset, limit), "sorted"
+        else:
+            columnar = open_columnar(filename)
+            if columnar is not None:
+                rows, source = columnar.rows(offset, limit), "columnar"
+            else:
+                rows = list(etl.head(read_dataset(filename, offset), limit).dicts())
+                source = "csv"
+        fields.update(rows=len(rows), source=source)
+    ROWS_SCANNED.inc(len(rows), operation="preview", source=source)
+    return rows
+
+
+def read_dataset(filename, offset=0):
+    """
+    Returns a petl table of the dataset's rows from row `offset` on,
+    seeking next to it with the row index when there is one.
+    """
+    path = dataset_path(filename)
+    table = etl.fromcsv(DatasetSource(path))
+    index = get_row_index(filename)
+    if index is None or not offset:
+        return etl.rowslice(table, offset, None)
+    if offset >= index.row_count:
+        return etl.head(table, 0)
+    start, skip = index.locate(offset)
+    table = etl.pushheader(etl.fromcsv(DatasetSource(path, start)), etl.header(table))
+    return etl.rowslice(table, skip, None)
+
+
+def iter_dataset_rows(filename, offset=0, sort="", chunk=1000):
+    """
+    Returns the header and an iterator over the rows (tuples) of a dataset
+    from row `offset` on, optionally ordered by `sort` (see
+    `load_dataset_preview()`). Rows are streamed from the file, or read
+    `chunk` at a time in sort order, so the dataset is never held in memory.
+    """
+    if not sort:
+        table = read_dataset(filename, offset)
+        return etl.header(table), iter(etl.data(table))
+
+    def rows():
+        start = offset
+        while True:
+            page = sorted_rows(filename, sort, start, chunk)
+            if not page:
+                return
+            for row in page:
+                yield tuple(row.values())
+            start += len(page)
+
+    return get_columnar(filename).header, rows()
+
+
+def _count_rows(filename, columns, limit, engine):
+    """
+    Computes `(values, count)` rows of a dataset with the given engine,
+    from the ingest profile for single columns. Module-level, so it can
+    run in worker processes.
+    Returns the rows and the number of dataset rows scanned for them.
+    """
+    if len(columns) == 1:
+        frequencies = load_frequencies(filename, columns[0])
+        if frequencies is not None:
+            top = frequencies if limit is None else frequencies[: max(limit, 0)]
+            return [((value,), n) for value, n in top], 0
+    if engine == "petl":
+        rows = count_combinations_petl(filename, columns, limit)
+    elif engine == "parallel":
+        rows = count_combinations_parallel(filename, columns, limit)
     else:
-        subset = etl.rowslice(table, offset, offset + limit)
-    return list(subset.dicts())
+        rows = count_combinations(filename, columns, limit, engine=engine)
+    return rows, get_summary(filename)["row_count"]
 
 
-def aggregate_provided_dataset(filename, columns):
+def _count_rows_in(directory, filename, columns, limit, engine):
+    """
+    Runs `_count_rows()` in a worker process on the datasets of
+    `directory`.
+    """
+    with using_data_dir(directory):
+        return _count_rows(filename, columns, limit, engine)
+
+
+def _counted(result, engine):
+    """
+    Records the rows scanned by a `_count_rows()` call (made in this
+    process or a worker) and returns its rows.
+    """
+    rows, scanned = result
+    ROWS_SCANNED.inc(scanned, operation="aggregate", source=engine)
+    return rows
+
+
+def aggregate_provided_dataset(filename, columns, limit=None):
     """
     Counts the occurrences of value combinations for selected columns.
-    Returns a list of dictionaries: each {col1: val1, col2: val2, ..., 'count': n}.
-    """
-    data_dir = os.path.join(settings.BASE_DIR, "data", "characters")
-    path = os.path.join(data_dir, filename)
-    table = etl.fromcsv(path)
-    agg_table = etl.aggregate(table, key=columns, aggregation=len)
-    agg_table = etl.rename(agg_table, {"value": "count"})
-    agg_table = etl.sort(agg_table, "count", reverse=True)
-    return list(agg_table.dicts())
+    Uses the counting engine set by `AGGREGATION_ENGINE`; "petl" scans the
+    CSV file, any other engine reads the columnar sidecar. Single columns
+    are answered from the profile computed at ingest. Results are
+    memoized per dataset and column set.
+    Returns a list of dictionaries: each {col1: val1, col2: val2, ..., 'count': n},
+    the `limit` most frequent combinations first.
+    """
+    engine = settings.AGGREGATION_ENGINE
+
+    def compute(canonical):
+        with span("aggregate", name=filename, columns=canonical, engine=engine):
+            return _counted(_count_rows(filename, canonical, limit, engine), engine)
+
+    rows = aggregation_cache.get_or_compute(filename, columns, limit, compute)
+    return [{**dict(zip(columns, values)), "count": n} for values, n in rows]
+
+
+def aggregate_datasets(datasets, columns, limit=None):
+    """
+    Counts the value combinations of `columns` in each of `datasets`, for
+    trend views across downloads. Returns one entry per dataset, in the
+    given order: `{"dataset": pk, "download_date": ..., "rows": [...]}`,
+    rows as returned by `aggregate_provided_dataset()`.
+    Each distinct data file is counted once. Cached results are reused;
+    single columns come from the ingest profiles, and other uncached
+    counts are fanned out over a long-lived pool of `AGGREGATION_PROCESSES`
+    processes.
+    """
+    engine = settings.AGGREGATION_ENGINE
+    canonical = sorted(columns)
+    results = {}
+    pending = []
+    for name in dict.fromkeys(ds.storage_name for ds in datasets):
+        rows = aggregation_cache.get(name, columns, limit)
+        if rows is None:
+            pending.append(name)
+        else:
+            results[name] = rows
+
+    # The parallel engine already spreads each scan over processes.
+    if len(pending) > 1 and len(columns) > 1 and engine != "parallel":
+        # Workers don't build artifacts, so they need no other settings.
+        for name in pending:
+            get_summary(name)
+        pool = get_pool("aggregation", settings.AGGREGATION_PROCESSES)
+        with span("aggregate_datasets", datasets=len(pending)):
+            try:
+                futures = [
+                    pool.submit(
+                        _count_rows_in, data_dir(), name, canonical, limit, engine
+                    )
+                    for name in pending
+                ]
+                computed = [future.result() for future in futures]
+            except BrokenProcessPool:
+                reset_pool("aggregation", pool)
+                raise
+    else:
+        computed = [_count_rows(name, canonical, limit, engine) for name in pending]
+    for name, result in zip(pending, computed):
+        rows = _counted(result, engine)
+        results[name] = aggregation_cache.put(name, columns, limit, rows)
+
+    return [
+        {
+            "dataset": ds.pk,
+            "download_date": ds.download_date.isoformat(),
+            "rows": [
+                {**dict(zip(columns, values)), "count": n}
+                for values, n in results[ds.storage_name]
+            ],
+        }
+        for ds in datasets
+    ]
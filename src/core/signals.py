@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .cache import aggregation_cache
+from .models import Dataset
+from .storage import delete_blob
+
+
+def _delete_unused_file(instance):
+    # Checked again once committed: a download may have stored an
+    # identical file meanwhile, which then shares this one.
+    if not instance.storage_users().exists():
+        delete_blob(instance.storage_name)
+
+
+@receiver(post_delete, sender=Dataset)
+def invalidate_dataset_caches(sender, instance, **kwargs):
+    """
+    Drops the cached results and, once the deletion is committed, the data
+    file and artifacts of a dataset when no other dataset shares them.
+    """
+    if not instance.storage_users().exists():
+        aggregation_cache.invalidate(instance.storage_name)
+        transaction.on_commit(lambda: _delete_unused_file(instance))
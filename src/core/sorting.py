@@ -0,0 +1,148 @@
+import heapq
+import os
+import pickle
+import shutil
+from array import array
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .columnar import _map, get_columnar
+from .search import to_number
+from .storage import sidecar_path, staging_path, write_atomic
+
+SORT = "sort"
+# Keys written to and read from runs (and row ids written to the
+# permutation) at a time.
+MERGE_BLOCK = 64 * 1024
+
+
+def sort_key(value):
+    """
+    Sort order of column values: numbers (as parsed by `to_number()`)
+    in numeric order, then any other values alphabetically.
+    """
+    number = to_number(value)
+    if number is None:
+        return (1, 0.0, value)
+    return (0, number, value)
+
+
+def _write_run(column, start, stop, path):
+    """
+    Sorts rows `start` to `stop` of the column in memory and writes them as
+    a run of `(sort_key, row)` pairs. Only the distinct values of the run
+    are decoded and ranked, so memory is bounded by the run size whatever
+    the column's cardinality.
+    """
+    codes = column.codes[start:stop]
+    if np is not None:
+        distinct, inverse = np.unique(
+            np.frombuffer(codes, np.uint32), return_inverse=True
+        )
+        keys = [sort_key(column.value(int(code))) for code in distinct]
+        ranks = np.empty(len(keys), dtype=np.uint32)
+        ranks[sorted(range(len(keys)), key=keys.__getitem__)] = np.arange(len(keys))
+        order = np.argsort(ranks[inverse], kind="stable")
+        pairs = ((keys[inverse[i]], start + int(i)) for i in order)
+    else:
+        keys = {code: sort_key(column.value(code)) for code in set(codes)}
+        order = sorted(range(len(codes)), key=lambda i: keys[codes[i]])
+        pairs = ((keys[codes[i]], start + i) for i in order)
+    with open(path, "wb") as f:
+        block = []
+        for pair in pairs:
+            block.append(pair)
+            if len(block) == MERGE_BLOCK:
+                pickle.dump(block, f)
+                block = []
+        pickle.dump(block, f)
+
+
+def _read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield from pickle.load(f)
+            except EOFError:
+                return
+
+
+def _write_merged(runs):
+    def write(f):
+        block = array("I")
+        for _, row in heapq.merge(*(_read_run(run) for run in runs)):
+            block.append(row)
+            if len(block) == MERGE_BLOCK:
+                block.tofile(f)
+                block = array("I")
+        block.tofile(f)
+
+    return write
+
+
+def _permutation_path(filename, dataset, name):
+    number = dataset.header.index(name)
+    return sidecar_path(filename, os.path.join(SORT, f"{number}.perm"))
+
+
+def build_permutation(filename, dataset, name):
+    """
+    Writes the row ids of a dataset in the order of column `name` (ties
+    in file order) with an external merge sort: runs of at most
+    `SORT_RUN_ROWS` rows are sorted in memory and spilled to disk along
+    with their sort keys, then merged in one streaming pass, so memory
+    stays bounded whatever the dataset size and column cardinality.
+    """
+    column = dataset.column(name)
+    run_rows = settings.SORT_RUN_ROWS
+    tmp_dir = staging_path()
+    os.makedirs(tmp_dir)
+    try:
+        runs = []
+        for start in range(0, dataset.row_count, run_rows):
+            run = os.path.join(tmp_dir, f"{len(runs)}.run")
+            _write_run(column, start, min(start + run_rows, dataset.row_count), run)
+            runs.append(run)
+        path = _permutation_path(filename, dataset, name)
+        write_atomic(path, _write_merged(runs))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return _map(path, "I")
+
+
+def get_permutation(filename, dataset, name):
+    """
+    Returns the sorted permutation of column `name` (row ids in sort
+    order), building and caching it on first use.
+    Raises KeyError for an unknown column.
+    """
+    dataset.column(name)
+    path = _permutation_path(filename, dataset, name)
+    if os.path.exists(path):
+        permutation = _map(path, "I")
+        if len(permutation) == dataset.row_count:
+            return permutation
+    return build_permutation(filename, dataset, name)
+
+
+def sorted_rows(filename, sort, offset, limit):
+    """
+    Returns `limit` rows from position `offset` of the dataset ordered by
+    `sort`: a column name, prefixed with "-" for descending order.
+    Pages are slices of the cached permutation, so a sorted page costs the
+    same as an unsorted one.
+    Raises KeyError for an unknown column.
+    """
+    dataset = get_columnar(filename)
+    permutation = get_permutation(filename, dataset, sort.lstrip("-"))
+    if sort.startswith("-"):
+        stop = max(dataset.row_count - offset, 0)
+        row_ids = list(permutation[max(stop - limit, 0) : stop])[::-1]
+    else:
+        row_ids = permutation[offset : offset + limit]
+    return dataset.rows_at(row_ids)
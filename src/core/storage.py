@@ -0,0 +1,436 @@
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import threading
+from array import array
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+from .metrics import BYTES_READ
+
+ROW_INDEX = "rows.idx"
+
+# File name suffix of each supported `DATASET_COMPRESSION` codec.
+EXTENSIONS = {"": "", "gzip": ".gz", "zstd": ".zst"}
+
+# Data directory given to a worker process task, see `using_data_dir()`.
+_data_dir = ContextVar("data_dir", default=None)
+
+
+def data_dir():
+    return _data_dir.get() or os.path.join(settings.BASE_DIR, "data", "characters")
+
+
+@contextmanager
+def using_data_dir(directory):
+    """
+    Resolves dataset files in `directory` within the block. Worker
+    processes outlive settings changes made after they started, so their
+    tasks take the data directory as an argument.
+    """
+    token = _data_dir.set(directory)
+    try:
+        yield
+    finally:
+        _data_dir.reset(token)
+
+
+def dataset_path(filename):
+    return os.path.join(data_dir(), filename)
+
+
+def blob_name(sha256, compression=""):
+    """
+    Returns the storage name of the dataset file with the given content
+    hash: byte-identical downloads share one file (and its artifacts).
+    The hash is that of the CSV content, whatever the `compression`.
+    """
+    return os.path.join("objects", sha256[:2], f"{sha256}.csv{EXTENSIONS[compression]}")
+
+
+def compression_of(filename):
+    for codec, extension in EXTENSIONS.items():
+        if codec and filename.endswith(extension):
+            return codec
+    return ""
+
+
+def _compressor(codec):
+    """
+    Returns a function compressing one block into an independent gzip
+    member or zstd frame (leaving it as is when there's no `codec`).
+    """
+    if not codec:
+        return bytes
+    if codec == "gzip":
+        return lambda data: gzip.compress(data, mtime=0)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured(
+                "DATASET_COMPRESSION='zstd' requires the zstandard package."
+            )
+        return zstandard.ZstdCompressor().compress
+    raise ImproperlyConfigured(f"Unknown DATASET_COMPRESSION: {codec!r}")
+
+
+def _decompressor(f, codec):
+    """
+    Wraps the binary file `f` into a stream decompressing it from its
+    current position, across all the blocks that follow.
+    """
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured(
+                "Reading zstd datasets requires the zstandard package."
+            )
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+        )
+    return f
+
+
+def staging_path():
+    """
+    Returns a unique temporary path inside the data directory, so that
+    finished files can be moved into place atomically.
+    """
+    return os.path.join(
+        data_dir(), ".staging", f"{os.getpid()}.{threading.get_ident()}.{uuid4().hex}"
+    )
+
+
+def store_blob(tmp_path, name, index):
+    """
+    Moves a finished dataset file, written (and compressed as `name`
+    says) by a `HashingSource`, into content-addressed storage along with
+    its row `index`.
+    Returns False (leaving `tmp_path` in place) when an identical file is
+    already stored.
+    """
+    path = dataset_path(name)
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    index.save(sidecar_path(name, ROW_INDEX))
+    return True
+
+
+def is_dataset_file(filename):
+    return any(
+        filename.endswith(f".csv{extension}") for extension in EXTENSIONS.values()
+    )
+
+
+def sidecar_dir(filename):
+    return os.path.join(data_dir(), ".sidecars", filename)
+
+
+def sidecar_path(filename, name):
+    """
+    Returns the path of a derived artifact (index, sidecar...) of a dataset.
+    All artifacts of one dataset live in a single directory, so they can be
+    dropped together with the data file.
+    """
+    return os.path.join(sidecar_dir(filename), name)
+
+
+def delete_blob(filename):
+    """
+    Removes a dataset file and its artifacts directory. Both are first
+    moved into a trash directory with atomic renames, so readers never
+    see a partially deleted file or artifact, then deleted.
+    Returns False when there was nothing to remove.
+    """
+    trash = os.path.join(data_dir(), ".trash", uuid4().hex)
+    os.makedirs(trash)
+    found = False
+    for path, target in (
+        (dataset_path(filename), "data"),
+        (sidecar_dir(filename), "sidecars"),
+    ):
+        try:
+            os.rename(path, os.path.join(trash, target))
+            found = True
+        except FileNotFoundError:
+            pass
+    shutil.rmtree(trash, ignore_errors=True)
+    return found
+
+
+def write_atomic(path, write):
+    """
+    Calls `write(fileobj)` on a temporary file which then replaces `path`,
+    so readers never see a partially written artifact.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _HashingWriter(io.BufferedIOBase):
+    def __init__(self, f, source):
+        self._f = f
+        self._source = source
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._source.sha256.update(data)
+        self._source.size += len(data)
+        return self._f.write(data)
+
+    def flush(self):
+        self._f.flush()
+
+
+class HashingSource:
+    """
+    petl source writing to `path` while computing the SHA-256 hash and
+    size of the written bytes, so no second pass is needed to address it.
+    With an `interval`, the row index of the file is recorded as it is
+    written (`index`), and with a `codec` the CSV is written compressed in
+    blocks of `interval` rows (see `_BlockWriter`), the hash and size
+    being those of the uncompressed bytes.
+    """
+
+    def __init__(self, path, codec="", interval=None):
+        self.path = path
+        self.codec = codec
+        self.interval = interval
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.index = None
+
+    @contextmanager
+    def open(self, mode="wb"):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, mode) as f:
+            if self.interval is None:
+                yield _HashingWriter(f, self)
+                return
+            blocks = _BlockWriter(f, self.codec, self.interval)
+            yield _HashingWriter(blocks, self)
+            self.index = blocks.close()
+
+
+class _BoundedReader(io.RawIOBase):
+    """
+    Reads at most `size` bytes of the binary file `f` from its current
+    position.
+    """
+
+    def __init__(self, f, size):
+        self.f = f
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.f.read(min(len(buffer), self.remaining))
+        buffer[: len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+class DatasetSource:
+    """
+    petl source reading a dataset file from the given byte offset onwards
+    (up to the `end` offset, if given), decompressing it as a stream when
+    it is stored compressed (offsets are then those of compressed blocks,
+    as recorded by the row index).
+    """
+
+    def __init__(self, path, offset=0, end=None):
+        self.path = path
+        self.offset = offset
+        self.end = end
+
+    @contextmanager
+    def open(self, mode="rb"):
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            stream = f
+            if self.end is not None:
+                stream = io.BufferedReader(_BoundedReader(f, self.end - self.offset))
+            try:
+                yield _decompressor(stream, compression_of(self.path))
+            finally:
+                BYTES_READ.inc(f.tell() - self.offset)
+
+
+def _read_record(f):
+    """
+    Reads one CSV record (which may span several lines when a quoted field
+    contains line breaks) and returns its bytes, b"" at EOF.
+    A record is complete once it holds an even number of quote characters.
+    """
+    lines = []
+    quotes = 0
+    while True:
+        line = f.readline()
+        if not line:
+            break
+        lines.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            break
+    return b"".join(lines)
+
+
+class _BlockWriter:
+    """
+    Splits the CSV bytes written to it into records (see `_read_record()`)
+    and writes them to the binary file `f` as independent compressed
+    blocks (gzip members or zstd frames, uncompressed without a `codec`):
+    the header, then one block per `interval` rows. `close()` returns the
+    `RowIndex` of the result, whose offsets point at block starts, so a
+    reader can seek to the block holding a row and decompress from there.
+    """
+
+    def __init__(self, f, codec, interval):
+        self.f = f
+        self.compress = _compressor(codec)
+        self.interval = interval
+        self.offsets = array("Q")
+        self.row_count = None
+        self.record = bytearray()
+        self.quotes = 0
+        self.block = bytearray()
+
+    def write(self, data):
+        start = len(self.record)
+        self.record += data
+        while True:
+            newline = self.record.find(b"\n", start)
+            if newline < 0:
+                self.quotes += self.record.count(b'"', start)
+                return len(data)
+            self.quotes += self.record.count(b'"', start, newline + 1)
+            start = newline + 1
+            if self.quotes % 2 == 0:
+                self._add(bytes(self.record[:start]))
+                del self.record[:start]
+                start = self.quotes = 0
+
+    def flush(self):
+        self.f.flush()
+
+    def _add(self, record):
+        if self.row_count is None:
+            self.f.write(self.compress(record))
+            self.row_count = 0
+            return
+        if self.row_count % self.interval == 0:
+            self._write_block()
+            self.offsets.append(self.f.tell())
+        self.block += record
+        self.row_count += 1
+
+    def _write_block(self):
+        if self.block:
+            self.f.write(self.compress(bytes(self.block)))
+            self.block.clear()
+
+    def close(self):
+        if self.record or self.row_count is None:
+            self._add(bytes(self.record))
+            self.record.clear()
+        self._write_block()
+        return RowIndex(self.interval, self.row_count, self.f.tell(), self.offsets)
+
+
+class RowIndex:
+    """
+    Sidecar holding the byte offset of every `interval`-th data row of a
+    CSV file, so a page of rows can be read by seeking close to it instead
+    of parsing every row before it. For compressed files, the offsets are
+    those of the compressed blocks starting at these rows.
+    Stored as an array of unsigned 64-bit integers:
+    `[interval, row_count, file_size, offset_0, offset_1, ...]`.
+    """
+
+    def __init__(self, interval, row_count, file_size, offsets):
+        self.interval = interval
+        self.row_count = row_count
+        self.file_size = file_size
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, path, interval):
+        offsets = array("Q")
+        row_count = 0
+        with open(path, "rb") as f:
+            position = len(_read_record(f))
+            while True:
+                size = len(_read_record(f))
+                if not size:
+                    break
+                if row_count % interval == 0:
+                    offsets.append(position)
+                position += size
+                row_count += 1
+        return cls(interval, row_count, position, offsets)
+
+    def save(self, path):
+        data = array("Q", [self.interval, self.row_count, self.file_size])
+        data.extend(self.offsets)
+        write_atomic(path, data.tofile)
+
+    @classmethod
+    def load(cls, path):
+        data = array("Q")
+        with open(path, "rb") as f:
+            data.frombytes(f.read())
+        return cls(data[0], data[1], data[2], data[3:])
+
+    def locate(self, row):
+        """
+        Returns `(byte_offset, rows_to_skip)` to reach data row `row`.
+        """
+        checkpoint = row // self.interval
+        return self.offsets[checkpoint], row - checkpoint * self.interval
+
+
+def build_row_index(filename):
+    index = RowIndex.build(dataset_path(filename), settings.DATASET_INDEX_INTERVAL)
+    index.save(sidecar_path(filename, ROW_INDEX))
+    return index
+
+
+def get_row_index(filename):
+    """
+    Returns the row index of a dataset, building it first for datasets
+    written before indexes existed (or whose index doesn't match the file).
+    Returns None for a compressed file without a matching index: block
+    offsets are only known when the file is written.
+    """
+    path = sidecar_path(filename, ROW_INDEX)
+    if os.path.exists(path):
+        index = RowIndex.load(path)
+        if index.file_size == os.path.getsize(dataset_path(filename)):
+            return index
+    if compression_of(filename):
+        return None
+    return build_row_index(filename)
@@ -0,0 +1,227 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .metrics import SWAPI_REQUEST_SECONDS, SWAPI_REQUESTS
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _is_transient(exc):
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code in RETRY_STATUSES
+
+
+def _page_url(url, page):
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query["page"] = str(page)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class SwapiClient:
+    """
+    SWAPI client holding one keep-alive, connection-pooled session
+    shared by all calls (paging and homeworld lookups alike).
+    Keeps per-request latency counters, see `stats()`.
+    """
+
+    def __init__(
+        self,
+        pool_size=10,
+        connect_timeout=3.05,
+        read_timeout=30,
+        max_retries=3,
+        retry_backoff=0.5,
+        fetch_workers=8,
+        concurrent_fetch=True,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.fetch_workers = fetch_workers
+        self.concurrent_fetch = concurrent_fetch
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+        )
+
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            pool_size=settings.SWAPI_POOL_SIZE,
+            connect_timeout=settings.SWAPI_CONNECT_TIMEOUT,
+            read_timeout=settings.SWAPI_READ_TIMEOUT,
+            max_retries=settings.SWAPI_MAX_RETRIES,
+            retry_backoff=settings.SWAPI_RETRY_BACKOFF,
+            fetch_workers=settings.SWAPI_FETCH_WORKERS,
+            concurrent_fetch=settings.SWAPI_CONCURRENT_FETCH,
+        )
+
+    def reset_stats(self):
+        with self._lock:
+            self._requests = 0
+            self._errors = 0
+            self._total_seconds = 0.0
+            self._max_seconds = 0.0
+
+    def stats(self):
+        """
+        Returns request count, error count and latency figures (in seconds)
+        of all requests made by this client since the last reset.
+        """
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "errors": self._errors,
+                "total_seconds": self._total_seconds,
+                "max_seconds": self._max_seconds,
+                "avg_seconds": (
+                    self._total_seconds / self._requests if self._requests else 0.0
+                ),
+            }
+
+    def _record(self, elapsed, failed):
+        SWAPI_REQUESTS.inc(outcome="error" if failed else "ok")
+        SWAPI_REQUEST_SECONDS.observe(elapsed)
+        with self._lock:
+            self._requests += 1
+            self._errors += int(failed)
+            self._total_seconds += elapsed
+            self._max_seconds = max(self._max_seconds, elapsed)
+
+    def _get(self, url, headers=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            resp.raise_for_status()
+            failed = False
+            return resp
+        finally:
+            self._record(time.perf_counter() - started, failed)
+
+    def get(self, url, headers=None):
+        """
+        Fetches `url` and returns the response.
+        Connection errors, timeouts and 429/5xx responses are retried
+        `max_retries` times with exponential backoff.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._get(url, headers)
+            except requests.RequestException as e:
+                if attempt >= self.max_retries or not _is_transient(e):
+                    raise
+            time.sleep(self.retry_backoff * 2**attempt)
+            attempt += 1
+
+    def get_json(self, url):
+        return self.get(url).json()
+
+    def get_first_page(self, url, etag="", last_modified=""):
+        """
+        Conditionally fetches the first page of a collection using the
+        validators of a previous download. Returns `(data, validators)`,
+        where `data` is None when the server answered 304 Not Modified.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        resp = self.get(url, headers=headers or None)
+        validators = {
+            "etag": resp.headers.get("ETag", ""),
+            "last_modified": resp.headers.get("Last-Modified", ""),
+        }
+        if resp.status_code == 304:
+            return None, validators
+        return resp.json(), validators
+
+    def iter_pages(self, url, first=None):
+        """
+        Yields the decoded pages of a paginated SWAPI collection, in order,
+        starting with `first` when the first page was already fetched.
+        The first page tells the total `count` and the page size, so the
+        remaining pages are downloaded concurrently by a bounded thread pool;
+        at most `fetch_workers` pages are in flight or buffered at a time.
+        Falls back to following `next` links one by one when the concurrent
+        mode is disabled or the page count can't be worked out.
+        """
+        if first is None:
+            first = self.get_json(url)
+        yield first
+        next_url = first.get("next")
+        count = first.get("count")
+        page_size = len(first.get("results", []))
+        if not next_url:
+            return
+
+        if not self.concurrent_fetch or not count or not page_size:
+            while next_url:
+                data = self.get_json(next_url)
+                yield data
+                next_url = data.get("next")
+            return
+
+        num_pages = math.ceil(count / page_size)
+        urls = (_page_url(next_url, page) for page in range(2, num_pages + 1))
+        workers = max(1, min(self.fetch_workers, num_pages - 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque(
+                pool.submit(self.get_json, u) for u in islice(urls, workers)
+            )
+            try:
+                while pending:
+                    data = pending.popleft().result()
+                    for u in islice(urls, 1):
+                        pending.append(pool.submit(self.get_json, u))
+                    yield data
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def fetch_collection(self, url):
+        """
+        Fetches all results of a paginated SWAPI collection, in page order.
+        """
+        results = []
+        for data in self.iter_pages(url):
+            results.extend(data.get("results", []))
+        return results
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the application-wide SWAPI client, created from settings
+    on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SwapiClient.from_settings()
+    return _client
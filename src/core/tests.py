@@ -1,22 +1,64 @@
 import os
 import csv
+import gzip
+import hashlib
 import tempfile
 import json
+import random
+import shutil
+import threading
+import warnings
+from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
 import petl as etl
+import requests
 
 from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase, override_settings, Client
 from django.urls import reverse
 from django.utils import timezone
 
-from core.models import Dataset
+from core.jobs import run_download_job
+from core.models import Dataset, DownloadJob, Planet
+from core.aggregation import (
+    chunk_ranges,
+    count_combinations,
+    count_combinations_parallel,
+    count_combinations_petl,
+)
+from core.cache import aggregation_cache
+from core.benchmarks.fakeswapi import FakeSwapi
+from core.benchmarks.runner import load_latest, run_benchmarks, save_results
+from core.benchmarks.synthetic import character
+from core.diff import diff_datasets
+from core.metrics import ROWS_SCANNED, ROWS_WRITTEN
+from core.columnar import ColumnarDataset, open_columnar
+from core.planets import PlanetResolver
+from core.profiles import get_summary, load_frequencies
+from core.retention import collect_orphans, select_expired
+from core import search, sorting
+from core.search import parse_filters, search_rows
+from core.storage import (
+    ROW_INDEX,
+    HashingSource,
+    blob_name,
+    dataset_path,
+    get_row_index,
+    sidecar_dir,
+    sidecar_path,
+    staging_path,
+    store_blob,
+)
+from core.swapi import SwapiClient
 from core.services import (
     transform_data,
     fetch_and_store_characters,
     load_dataset_preview,
     aggregate_provided_dataset,
+    store_table,
 )
 
 
@@ -47,7 +89,7 @@ class ServicesTests(TestCase):
             },
         ]
 
-    @patch("core.services.requests.get")
+    @patch("core.swapi.requests.Session.get")
     def test_transform_data(self, mock_get):
         mock_resp = MagicMock()
         mock_resp.raise_for_status.return_value = None
@@ -72,10 +114,12 @@ class ServicesTests(TestCase):
             ]:
                 self.assertNotIn(f, rec)
 
-    @patch("core.services.requests.get")
+    @patch("core.swapi.requests.Session.get")
     def test_fetch_and_store_characters(self, mock_get):
         page1 = MagicMock()
         page1.raise_for_status.return_value = None
+        page1.status_code = 200
+        page1.headers = {"ETag": '"v1"'}
         page1.json.return_value = {
             "results": [
                 {
@@ -112,13 +156,208 @@ class ServicesTests(TestCase):
         }
         mock_get.side_effect = [page1, page2]
         with tempfile.TemporaryDirectory() as tmpdir:
-            with override_settings(BASE_DIR=tmpdir):
-                fname = fetch_and_store_characters()
+            with override_settings(BASE_DIR=tmpdir, SWAPI_PREFETCH_PLANETS=False):
+                progress = MagicMock()
+                ds = fetch_and_store_characters(progress=progress)
                 data_dir = os.path.join(tmpdir, "data", "characters")
-                path = os.path.join(data_dir, fname)
+                path = os.path.join(data_dir, ds.storage_name)
                 self.assertTrue(os.path.exists(path))
-                ds = Dataset.objects.get(filename=fname)
+                with open(path, "rb") as f:
+                    content = f.read()
+                self.assertEqual(ds.sha256, hashlib.sha256(content).hexdigest())
+                self.assertEqual(ds.size, len(content))
+                ds = Dataset.objects.get(filename=ds.filename)
                 self.assertIsNotNone(ds.download_date)
+                progress.assert_any_call(pages_fetched=2, rows_written=1)
+                progress.assert_called_with(rows_written=2)
+                with open(path) as f:
+                    rows = list(csv.DictReader(f))
+                self.assertEqual([r["name"] for r in rows], ["A", "B"])
+                self.assertEqual(rows[1]["date"], "2025-01-02")
+                self.assertEqual(ds.row_count, 2)
+                self.assertEqual(ds.columns[0], "name")
+                self.assertIn("date", ds.columns)
+                self.assertEqual(
+                    load_frequencies(ds.storage_name, "date"),
+                    [["2025-01-01", 1], ["2025-01-02", 1]],
+                )
+                columnar = open_columnar(ds.storage_name)
+                self.assertEqual(columnar.row_count, 2)
+                self.assertEqual(columnar.rows(1, 1)[0]["name"], "B")
+
+    @patch("core.swapi.requests.Session.get")
+    def test_fetch_and_store_characters_incremental_refresh(self, mock_get):
+        people = [
+            {**self.records[0], "name": "A", "edited": "2025-01-01T00:00:00Z"},
+            {**self.records[0], "name": "B", "edited": "2025-01-02T00:00:00Z"},
+        ]
+        people[0]["homeworld"] = "http://p/1/"
+        people[1]["homeworld"] = "http://p/2/"
+        planets = {"http://p/1/": "Tatooine", "http://p/2/": "Naboo"}
+
+        def respond(url, headers=None, **kwargs):
+            resp = MagicMock()
+            resp.raise_for_status.return_value = None
+            resp.headers = {"ETag": '"v1"'}
+            resp.status_code = (
+                304 if headers and headers["If-None-Match"] == '"v1"' else 200
+            )
+            if url in planets:
+                resp.json.return_value = {"name": planets[url]}
+            elif "page=2" in url:
+                resp.json.return_value = {
+                    "count": len(people),
+                    "results": people[1:],
+                    "next": None,
+                }
+            else:
+                resp.json.return_value = {
+                    "count": len(people),
+                    "results": people[:1],
+                    "next": "http://swapi/api/people/?page=2",
+                }
+            return resp
+
+        mock_get.side_effect = respond
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(BASE_DIR=tmpdir, SWAPI_PREFETCH_PLANETS=False):
+                first = fetch_and_store_characters()
+                self.assertEqual(first.source_count, 2)
+                self.assertEqual(first.source_edited, "2025-01-02T00:00:00Z")
+
+                self.assertEqual(fetch_and_store_characters(), first)
+                first.source_etag = ""
+                first.save()
+                calls = mock_get.call_count
+                # Nothing is transformed nor written for an unchanged source.
+                with patch("core.services.store_table") as mock_store:
+                    self.assertEqual(fetch_and_store_characters(), first)
+                mock_store.assert_not_called()
+                self.assertEqual(mock_get.call_count, calls + 2)
+                self.assertEqual(Dataset.objects.count(), 1)
+                self.assertEqual(
+                    os.listdir(os.path.join(tmpdir, "data", "characters", ".staging")),
+                    [],
+                )
+
+                people[1] = {**people[1], "edited": "2025-02-01T00:00:00Z"}
+                planets["http://p/2/"] = "Naboo II"
+                second = fetch_and_store_characters()
+                self.assertNotEqual(second, first)
+                self.assertNotEqual(second.sha256, first.sha256)
+                self.assertEqual(
+                    [
+                        row["homeworld"]
+                        for row in load_dataset_preview(second.storage_name)
+                    ],
+                    ["Tatooine", "Naboo II"],
+                )
+
+                with override_settings(SWAPI_INCREMENTAL_REFRESH=False):
+                    third = fetch_and_store_characters()
+                self.assertNotEqual(third.pk, second.pk)
+                self.assertEqual(third.storage_name, second.storage_name)
+                blobs = os.path.dirname(
+                    os.path.join(tmpdir, "data", "characters", third.storage_name)
+                )
+                self.assertEqual(len(os.listdir(blobs)), 1)
+
+    @patch("core.swapi.requests.Session.get")
+    def test_fetch_collection_concurrent_keeps_page_order(self, mock_get):
+        def page(url, **kwargs):
+            number = int(url.split("page=")[1]) if "page=" in url else 1
+            resp = MagicMock()
+            resp.raise_for_status.return_value = None
+            resp.json.return_value = {
+                "count": 5,
+                "results": [{"name": f"p{number}"}] * (2 if number < 3 else 1),
+                "next": (
+                    None if number == 3 else f"http://api/people/?page={number + 1}"
+                ),
+            }
+            return resp
+
+        mock_get.side_effect = page
+        client = SwapiClient()
+        results = client.fetch_collection("http://api/people/")
+        self.assertEqual([r["name"] for r in results], ["p1", "p1", "p2", "p2", "p3"])
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(client.stats()["requests"], 3)
+
+    @patch("core.swapi.time.sleep")
+    @patch("core.swapi.requests.Session.get")
+    def test_fetch_collection_retries_transient_errors(self, mock_get, mock_sleep):
+        ok = MagicMock()
+        ok.raise_for_status.return_value = None
+        ok.json.return_value = {"results": [{"name": "A"}], "next": None}
+        mock_get.side_effect = [requests.ConnectionError(), ok]
+        client = SwapiClient()
+        results = client.fetch_collection("http://api/people/")
+        self.assertEqual(results, [{"name": "A"}])
+        mock_sleep.assert_called_once()
+        self.assertEqual(client.stats()["errors"], 1)
+
+    def test_swapi_client_session_is_pooled(self):
+        client = SwapiClient(pool_size=4, connect_timeout=1, read_timeout=2)
+        adapter = client.session.get_adapter("http://swapi:12345/api/")
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertIn("gzip", client.session.headers["Accept-Encoding"])
+        self.assertEqual(client.timeout, (1, 2))
+
+    def test_transform_data_streams_records(self):
+        consumed = []
+
+        def records():
+            for rec in self.records:
+                consumed.append(rec["name"])
+                yield rec
+
+        table = transform_data(records(), resolve_planet=lambda url: url and "Tatooine")
+        it = iter(etl.dicts(table))
+        self.assertEqual(next(it)["name"], "Luke")
+        self.assertEqual(consumed, ["Luke"])
+        self.assertEqual(next(it)["homeworld"], "")
+
+    def test_planet_resolver_persists_across_downloads(self):
+        client = MagicMock()
+        client.get_json.return_value = {"name": "Tatooine"}
+        resolver = PlanetResolver(client=client)
+        self.assertEqual(resolver("http://api/planets/1/"), "Tatooine")
+        self.assertEqual(resolver("http://api/planets/1/"), "Tatooine")
+        self.assertEqual(client.get_json.call_count, 1)
+
+        next_download = PlanetResolver(client=client)
+        self.assertEqual(next_download("http://api/planets/1/"), "Tatooine")
+        self.assertEqual(client.get_json.call_count, 1)
+
+        expired = PlanetResolver(client=client, ttl=-1)
+        self.assertTrue(expired.is_cold)
+        expired("http://api/planets/1/")
+        self.assertEqual(client.get_json.call_count, 2)
+
+        # Failures are memoized per resolver and fall back to the last
+        # known name, else the URL.
+        client.get_json.side_effect = requests.ConnectionError()
+        failing = PlanetResolver(client=client, ttl=-1)
+        for _ in range(3):
+            self.assertEqual(failing("http://api/planets/1/"), "Tatooine")
+            self.assertEqual(failing("http://api/planets/2/"), "http://api/planets/2/")
+        self.assertEqual(client.get_json.call_count, 4)
+        fresh = PlanetResolver(client=client)
+        self.assertEqual(fresh("http://api/planets/1/", fresh=True), "Tatooine")
+
+    def test_planet_resolver_prefetch(self):
+        client = MagicMock()
+        client.fetch_collection.return_value = [
+            {"name": "Tatooine", "url": "http://api/planets/1/"},
+            {"name": "Alderaan", "url": "http://api/planets/2/"},
+        ]
+        resolver = PlanetResolver(client=client)
+        self.assertTrue(resolver.is_cold)
+        resolver.prefetch("http://api/planets/")
+        self.assertEqual(resolver("http://api/planets/2/"), "Alderaan")
+        client.get_json.assert_not_called()
+        self.assertEqual(Planet.objects.count(), 2)
 
     def test_load_dataset_preview_and_aggregate(self):
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -147,19 +386,612 @@ class ServicesTests(TestCase):
                 counts = {row["col1"]: row["count"] for row in agg}
                 self.assertEqual(counts, {"X": 2, "Y": 1})
 
+    def test_load_dataset_preview_seeks_with_row_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "indexed.csv"
+            rows = [["name", "note"]] + [
+                [f"n{i}", "multi\nline" if i % 3 == 0 else "x"] for i in range(7)
+            ]
+            with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                csv.writer(f).writerows(rows)
+            with override_settings(BASE_DIR=tmpdir, DATASET_INDEX_INTERVAL=2):
+                preview = load_dataset_preview(fname, offset=3, limit=3)
+                self.assertEqual(
+                    preview,
+                    [
+                        {"name": "n3", "note": "multi\nline"},
+                        {"name": "n4", "note": "x"},
+                        {"name": "n5", "note": "x"},
+                    ],
+                )
+                self.assertTrue(os.path.exists(sidecar_path(fname, ROW_INDEX)))
+                index = get_row_index(fname)
+                self.assertEqual(index.row_count, 7)
+                self.assertEqual(len(index.offsets), 4)
+                self.assertEqual(load_dataset_preview(fname, offset=6)[0]["name"], "n6")
+                self.assertEqual(load_dataset_preview(fname, offset=7), [])
+
+    def test_row_index_is_recorded_while_writing(self):
+        rows = [["name", "note"]] + [
+            [f"n{i}", "multi\nline" if i % 3 == 0 else "x"] for i in range(7)
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(BASE_DIR=tmpdir, DATASET_INDEX_INTERVAL=2), patch(
+                "core.storage.RowIndex.build"
+            ) as mock_build:
+                name = store_table(rows).storage_name
+                mock_build.assert_not_called()
+                index = get_row_index(name)
+                self.assertEqual(index.row_count, 7)
+                self.assertEqual(index.file_size, os.path.getsize(dataset_path(name)))
+                self.assertEqual(
+                    [r["name"] for r in load_dataset_preview(name, offset=3, limit=2)],
+                    ["n3", "n4"],
+                )
+
+    def test_compressed_storage_is_seekable(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            rows = [["name", "note"]] + [
+                [f"n{i}", "multi\nline" if i % 3 == 0 else "x"] for i in range(7)
+            ]
+            with override_settings(
+                BASE_DIR=tmpdir, DATASET_INDEX_INTERVAL=2, DATASET_COMPRESSION="gzip"
+            ):
+                tmp_path = staging_path()
+                sink = HashingSource(tmp_path, "gzip", 2)
+                etl.tocsv(rows, sink)
+                name = blob_name(sink.sha256.hexdigest(), "gzip")
+                self.assertTrue(store_blob(tmp_path, name, sink.index))
+                with gzip.open(dataset_path(name), "rt", newline="") as f:
+                    self.assertEqual(list(csv.reader(f)), rows)
+
+                index = get_row_index(name)
+                self.assertEqual(index.row_count, 7)
+                self.assertEqual(index.file_size, os.path.getsize(dataset_path(name)))
+                self.assertEqual(
+                    load_dataset_preview(name, offset=3, limit=3),
+                    [
+                        {"name": "n3", "note": "multi\nline"},
+                        {"name": "n4", "note": "x"},
+                        {"name": "n5", "note": "x"},
+                    ],
+                )
+                self.assertEqual(
+                    count_combinations_petl(name, ["note"]),
+                    [(("x",), 4), (("multi\nline",), 3)],
+                )
+                # Without a row index, the file is decompressed from the start.
+                os.remove(sidecar_path(name, ROW_INDEX))
+                self.assertIsNone(get_row_index(name))
+                self.assertEqual(load_dataset_preview(name, offset=6)[0]["name"], "n6")
+
+    def test_to_number_rejects_non_finite_values(self):
+        self.assertEqual(search.to_number("1,358"), 1358)
+        self.assertEqual(search.to_number("4ABY"), -4)
+        for value in ("nan", "inf", "-inf", "NaNBBY"):
+            self.assertIsNone(search.to_number(value))
+        values = ["172", "nan", "96", "inf", "unknown"]
+        self.assertEqual(
+            sorted(values, key=sorting.sort_key), ["96", "172", "inf", "nan", "unknown"]
+        )
+
+    def test_search_rows_with_inverted_indexes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "search.csv"
+            rows = [
+                ["name", "height", "homeworld", "birth_year"],
+                ["Luke", "172", "Tatooine", "19BBY"],
+                ["Leia", "150", "Alderaan", "19BBY"],
+                ["Owen", "178", "Tatooine", "52BBY"],
+                ["Lobot", "unknown", "Bespin", "37BBY"],
+                ["Beru", "165", "Tatooine", "47BBY"],
+            ]
+            with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                csv.writer(f).writerows(rows)
+
+            def names(params, **kwargs):
+                result = search_rows(fname, parse_filters(params), **kwargs)
+                return result["total"], [r["name"] for r in result["rows"]]
+
+            with override_settings(BASE_DIR=tmpdir):
+                for numpy in (search.np, None):
+                    with patch("core.search.np", numpy):
+                        self.assertEqual(
+                            names([("homeworld", ["Tatooine"])]),
+                            (3, ["Luke", "Owen", "Beru"]),
+                        )
+                        self.assertEqual(
+                            names([("name__prefix", ["Le", "Lo"])]),
+                            (2, ["Leia", "Lobot"]),
+                        )
+                        self.assertEqual(
+                            names(
+                                [
+                                    ("homeworld", ["Tatooine"]),
+                                    ("height__gte", ["170"]),
+                                    ("birth_year__lt", ["50"]),
+                                ]
+                            ),
+                            (1, ["Luke"]),
+                        )
+                        self.assertEqual(
+                            names([("height__lte", ["175"])], offset=1, limit=1),
+                            (3, ["Leia"]),
+                        )
+                        self.assertEqual(names([("homeworld", ["Naboo"])]), (0, []))
+                result = search_rows(fname, [], offset=4)
+                self.assertEqual(result["row_ids"], [4])
+                with self.assertRaises(ValueError):
+                    parse_filters([("height__gte", ["tall"])])
+                with self.assertRaises(KeyError):
+                    search_rows(fname, parse_filters([("eyes", ["blue"])]))
+
+    def test_sorted_preview_uses_external_merge_sort(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "sorted.csv"
+            heights = ["172", "96", "unknown", "202", "150", "96", "1,358"]
+            with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["name", "height"])
+                writer.writerows([f"n{i}", h] for i, h in enumerate(heights))
+
+            def names(**kwargs):
+                return [r["name"] for r in load_dataset_preview(fname, **kwargs)]
+
+            for numpy in (sorting.np, None):
+                with override_settings(BASE_DIR=tmpdir, SORT_RUN_ROWS=2), patch(
+                    "core.sorting.np", numpy
+                ):
+                    shutil.rmtree(sidecar_path(fname, "sort"), ignore_errors=True)
+                    self.assertEqual(
+                        names(sort="height", limit=10),
+                        ["n1", "n5", "n4", "n0", "n3", "n6", "n2"],
+                    )
+                    self.assertEqual(
+                        names(sort="height", offset=2, limit=2), ["n4", "n0"]
+                    )
+                    self.assertEqual(
+                        names(sort="-height", offset=1, limit=3), ["n6", "n3", "n0"]
+                    )
+                    self.assertEqual(names(sort="-height", offset=6), ["n1"])
+                    self.assertEqual(names(sort="height", offset=7), [])
+                    self.assertEqual(os.listdir(os.path.join(data_dir, ".staging")), [])
+            # Spilled columns have several codes per value; ties stay in
+            # file order.
+            with override_settings(
+                BASE_DIR=tmpdir, SORT_RUN_ROWS=3, COLUMNAR_MAX_DISTINCT=2
+            ):
+                shutil.rmtree(sidecar_dir(fname))
+                self.assertEqual(
+                    names(sort="height", limit=10),
+                    ["n1", "n5", "n4", "n0", "n3", "n6", "n2"],
+                )
+                self.assertIn(1, open_columnar(fname).spilled)
+            with override_settings(BASE_DIR=tmpdir), self.assertRaises(KeyError):
+                load_dataset_preview(fname, sort="eyes")
+
+    def test_diff_datasets_by_key(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            contents = {
+                "old.csv": [
+                    ["name", "mass", "hair"],
+                    ["Luke", "77", "blond"],
+                    ["Leia", "49", "brown"],
+                    ["Owen", "120", "brown"],
+                    ["R2-D2", "32", "n/a"],
+                ],
+                "new.csv": [
+                    ["name", "mass", "eyes"],
+                    ["Owen", "120", "blue"],
+                    ["Luke", "78", "blue"],
+                    ["Beru", "75", "blue"],
+                    ["R2-D2", "32", "red"],
+                ],
+            }
+            for fname, rows in contents.items():
+                with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                    csv.writer(f).writerows(rows)
+            with override_settings(BASE_DIR=tmpdir):
+                result = diff_datasets("old.csv", "new.csv")
+                self.assertEqual(result["columns_added"], ["eyes"])
+                self.assertEqual(result["columns_removed"], ["hair"])
+                self.assertEqual(
+                    [result[kind] for kind in ("added", "removed", "modified")],
+                    [1, 1, 1],
+                )
+                self.assertEqual(result["unchanged"], 2)
+                self.assertEqual(result["rows"]["added"][0]["name"], "Beru")
+                self.assertEqual(result["rows"]["removed"][0]["name"], "Leia")
+                self.assertEqual(
+                    result["rows"]["modified"],
+                    [{"key": "Luke", "changes": {"mass": ["77", "78"]}}],
+                )
+                same = diff_datasets("old.csv", "old.csv")
+                self.assertEqual((same["unchanged"], same["modified"]), (4, 0))
+                with self.assertRaises(KeyError):
+                    diff_datasets("old.csv", "new.csv", key="hair")
+
+                old, new = (
+                    Dataset.objects.create(filename=fname, download_date=timezone.now())
+                    for fname in contents
+                )
+                url = reverse("diff_dataset", args=[old.pk, new.pk])
+                response = self.client.get(url, {"limit": 0})
+                self.assertEqual(response.json()["modified"], 1)
+                self.assertEqual(response.json()["rows"]["modified"], [])
+                response = self.client.get(url, {"key": "eyes"})
+                self.assertEqual(response.status_code, 400)
+
+    @override_settings(COLUMNAR_MAX_DISTINCT=3)
+    def test_high_cardinality_columns_spill_their_dictionary(self):
+        rows = [["name", "col"]]
+        rows += [[f"n{i}", "XYZWV"[i % 5]] for i in range(20)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(BASE_DIR=tmpdir):
+                name = store_table(rows).storage_name
+                dataset = open_columnar(name)
+                self.assertEqual(dataset.spilled, {0, 1})
+                self.assertIsNone(load_frequencies(name, "col"))
+                self.assertIsNone(get_summary(name)["distinct"]["col"])
+                expected = count_combinations_petl(name, ["col"])
+                self.assertEqual(expected[0], (("V",), 4))
+                for engine in ("python", "numpy"):
+                    self.assertEqual(
+                        count_combinations(name, ["col"], engine=engine), expected
+                    )
+                self.assertEqual(
+                    aggregate_provided_dataset(name, ["col"], limit=1),
+                    [{"col": "V", "count": 4}],
+                )
+                found = search_rows(name, parse_filters([("col", ["W"])]))
+                self.assertEqual(found["row_ids"], [3, 8, 13, 18])
+                preview = load_dataset_preview(name, limit=2, sort="-name")
+                self.assertEqual([row["name"] for row in preview], ["n9", "n8"])
+                self.assertEqual(dataset.rows(-2, 10), dataset.rows(0, 10))
+
+    def test_columnar_sidecar_reads_only_selected_columns(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "columnar.csv"
+            with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                csv.writer(f).writerows(
+                    [["a", "b", "c"], ["x", "1", "ż"], ["y", "1", ""], ["x", "1", "ż"]]
+                )
+            with override_settings(BASE_DIR=tmpdir):
+                self.assertIsNone(open_columnar(fname))
+                agg = aggregate_provided_dataset(fname, ["b", "a"])
+                self.assertEqual(
+                    agg,
+                    [
+                        {"b": "1", "a": "x", "count": 2},
+                        {"b": "1", "a": "y", "count": 1},
+                    ],
+                )
+                columnar = ColumnarDataset(fname)
+                self.assertEqual(columnar.row_count, 3)
+                self.assertEqual(columnar.column("c").cardinality, 2)
+                self.assertEqual(list(columnar._columns), ["c"])
+                self.assertEqual(
+                    load_dataset_preview(fname, offset=1, limit=5),
+                    [{"a": "y", "b": "1", "c": ""}, {"a": "x", "b": "1", "c": "ż"}],
+                )
+
+    def test_aggregation_engines_agree(self):
+        rng = random.Random(7)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "engines.csv"
+            with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["eye", "hair", "name"])
+                for i in range(300):
+                    writer.writerow(
+                        [rng.choice("abcd"), rng.choice("xyz"), f"n{i % 50}"]
+                    )
+            with override_settings(BASE_DIR=tmpdir):
+                expected = count_combinations_petl(fname, ["hair", "eye"])
+                for engine in ("python", "numpy"):
+                    self.assertEqual(
+                        count_combinations(fname, ["hair", "eye"], engine=engine),
+                        expected,
+                    )
+                    self.assertEqual(
+                        count_combinations(fname, ["hair", "eye"], 3, engine=engine),
+                        expected[:3],
+                    )
+                for engine in ("petl", "auto", "parallel"):
+                    with override_settings(AGGREGATION_ENGINE=engine):
+                        top = aggregate_provided_dataset(fname, ["name"], limit=2)
+                        self.assertEqual(len(top), 2)
+                        self.assertEqual(top[0]["count"], 6)
+                        aggregation_cache.invalidate(fname)
+                        for columns in (["name"], ["hair", "eye"]):
+                            self.assertEqual(
+                                aggregate_provided_dataset(fname, columns, 0), []
+                            )
+
+    @override_settings(DATASET_INDEX_INTERVAL=7, SCAN_PROCESSES=2)
+    def test_parallel_scan_matches_petl(self):
+        rng = random.Random(3)
+        rows = [["eye", "hair", "quote"]]
+        for i in range(200):
+            # Quoted fields with line breaks must not be split by chunks.
+            quote = "line\nbreak, quoted" if i % 9 == 0 else f"q{i}"
+            rows.append([rng.choice("abcd"), rng.choice("xyz"), quote])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for compression in ("", "gzip"):
+                with override_settings(
+                    BASE_DIR=tmpdir, DATASET_COMPRESSION=compression
+                ):
+                    name = store_table(rows).storage_name
+                    ranges = chunk_ranges(get_row_index(name), 8)
+                    self.assertEqual(len(ranges), 8)
+                    expected = count_combinations_petl(name, ["hair", "eye"])
+                    self.assertEqual(
+                        count_combinations_parallel(name, ["hair", "eye"]), expected
+                    )
+                    self.assertEqual(
+                        count_combinations_parallel(name, ["hair", "eye"], 2),
+                        expected[:2],
+                    )
+                    with self.assertRaises(KeyError):
+                        count_combinations_parallel(name, ["nope"])
+            with override_settings(BASE_DIR=tmpdir):
+                with self.assertRaises(TimeoutError):
+                    count_combinations_parallel(name, ["eye"], timeout=-1)
+
+    def test_aggregation_results_are_memoized(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "memo.csv"
+            with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                csv.writer(f).writerows(
+                    [["a", "b"], ["x", "1"], ["x", "2"], ["x", "1"]]
+                )
+            with override_settings(BASE_DIR=tmpdir):
+                ds = Dataset.objects.create(
+                    filename=fname, download_date=timezone.now()
+                )
+                before = aggregation_cache.stats()
+                first = aggregate_provided_dataset(fname, ["a", "b"])
+                with patch("core.services.count_combinations") as mock_count:
+                    swapped = aggregate_provided_dataset(fname, ["b", "a"])
+                    mock_count.assert_not_called()
+                self.assertEqual(
+                    first,
+                    [
+                        {"a": "x", "b": "1", "count": 2},
+                        {"a": "x", "b": "2", "count": 1},
+                    ],
+                )
+                self.assertEqual(list(swapped[0]), ["b", "a", "count"])
+                self.assertEqual(swapped[0]["count"], 2)
+                after = aggregation_cache.stats()
+                self.assertEqual(after["misses"] - before["misses"], 1)
+                self.assertEqual(after["hits"] - before["hits"], 1)
+
+                ds.delete()
+                with patch("core.services.count_combinations") as mock_count:
+                    mock_count.return_value = []
+                    aggregate_provided_dataset(fname, ["a", "b"])
+                    mock_count.assert_called_once()
+
+    def test_single_column_aggregation_uses_profile(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "profiled.csv"
+            with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                csv.writer(f).writerows(
+                    [["a", "b"], ["x", "1"], ["y", "2"], ["x", "3"]]
+                )
+            with override_settings(BASE_DIR=tmpdir):
+                summary = get_summary(fname)
+                self.assertEqual(summary["row_count"], 3)
+                self.assertEqual(summary["distinct"], {"a": 2, "b": 3})
+                with patch("core.services.count_combinations") as mock_count:
+                    agg = aggregate_provided_dataset(fname, ["a"])
+                    mock_count.assert_not_called()
+                self.assertEqual(agg, [{"a": "x", "count": 2}, {"a": "y", "count": 1}])
+
+    @patch("core.profiles.TABLE_MIN_ENTRIES", 1)
+    def test_mostly_unique_columns_have_no_frequency_table(self):
+        rows = [["a", "b"], ["x", "1"], ["y", "2"], ["x", "3"], ["x", "4"]]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(BASE_DIR=tmpdir):
+                name = store_table(rows).storage_name
+                self.assertEqual(get_summary(name)["distinct"], {"a": 2, "b": 4})
+                self.assertEqual(load_frequencies(name, "a"), [["x", 3], ["y", 1]])
+                self.assertIsNone(load_frequencies(name, "b"))
+                agg = aggregate_provided_dataset(name, ["b"], limit=1)
+                self.assertEqual(agg, [{"b": "1", "count": 1}])
+
+
+class RetentionTests(TestCase):
+    def test_select_expired(self):
+        now = timezone.make_aware(datetime(2025, 6, 18, 12))
+        datasets = [
+            Dataset(pk=pk, filename=f"{pk}.csv", size=100, download_date=now - age)
+            for pk, age in enumerate(
+                [
+                    timedelta(hours=1),
+                    timedelta(hours=2),
+                    timedelta(days=3, hours=1),
+                    timedelta(days=3, hours=2),
+                    timedelta(days=40),
+                    timedelta(days=41),
+                ],
+                1,
+            )
+        ]
+        expired = select_expired(datasets, now, keep_last=1, daily_after=2)
+        self.assertEqual(sorted(ds.pk for ds in expired), [4])
+        expired = select_expired(
+            datasets, now, keep_last=1, daily_after=2, weekly_after=30
+        )
+        self.assertEqual(sorted(ds.pk for ds in expired), [4, 6])
+        # The oldest go first; the newest dataset is always kept.
+        expired = select_expired(datasets, now, max_bytes=250)
+        self.assertEqual(sorted(ds.pk for ds in expired), [3, 4, 5, 6])
+        self.assertEqual(len(select_expired(datasets, now, max_bytes=1)), 5)
+        self.assertEqual(select_expired(datasets, now), [])
+
+        # Artifacts count along with the data file.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(BASE_DIR=tmpdir):
+                os.makedirs(sidecar_dir("2.csv"))
+                with open(os.path.join(sidecar_dir("2.csv"), "rows.idx"), "wb") as f:
+                    f.write(bytes(100))
+                expired = select_expired(datasets, now, max_bytes=250)
+        self.assertEqual(sorted(ds.pk for ds in expired), [2, 3, 4, 5, 6])
+
+    def test_deleting_datasets_removes_unused_files(self):
+        table = [["name", "col"], ["a", "X"], ["b", "Y"]]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(BASE_DIR=tmpdir):
+                first = store_table(table)
+                first.download_date = timezone.now()
+                first.save()
+                second = Dataset.objects.get(pk=first.pk)
+                second.pk = None
+                second.save()
+                name = first.storage_name
+                self.assertTrue(os.path.isdir(sidecar_dir(name)))
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    first.delete()
+                self.assertTrue(os.path.exists(dataset_path(name)))
+                with self.captureOnCommitCallbacks(execute=True):
+                    second.delete()
+                self.assertFalse(os.path.exists(dataset_path(name)))
+                self.assertFalse(os.path.exists(sidecar_dir(name)))
+
+                kept = store_table([["name"], ["c"]])
+                kept.download_date = timezone.now()
+                kept.save()
+                orphan = store_table([["name"], ["d"]]).storage_name
+                os.makedirs(sidecar_dir("gone.csv"))
+                self.assertEqual(collect_orphans(grace=60), [])
+                self.assertEqual(
+                    sorted(collect_orphans(dry_run=True, grace=-1)),
+                    sorted([orphan, "gone.csv"]),
+                )
+                with self.settings(RETENTION_ORPHAN_GRACE=-1):
+                    call_command("apply_retention", stdout=open(os.devnull, "w"))
+                self.assertFalse(os.path.exists(dataset_path(orphan)))
+                self.assertFalse(os.path.exists(sidecar_dir(orphan)))
+                self.assertFalse(os.path.exists(sidecar_dir("gone.csv")))
+                self.assertTrue(os.path.exists(dataset_path(kept.storage_name)))
+                self.assertTrue(Dataset.objects.filter(pk=kept.pk).exists())
+
+
+class BenchmarkTests(TestCase):
+    def test_fake_swapi_pages(self):
+        with FakeSwapi(records=25, page_size=10) as server:
+            client = SwapiClient(concurrent_fetch=True)
+            people = client.fetch_collection(f"{server.url}/people/")
+            self.assertEqual(len(people), 25)
+            self.assertEqual(people[24]["name"], "Character 25")
+            self.assertEqual(people[0], character(1, server.url))
+            planet = client.get_json(people[0]["homeworld"])
+            self.assertTrue(planet["name"].startswith("Planet "))
+            self.assertEqual(server.requests, 4)
+
+    def test_run_benchmarks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results = run_benchmarks(
+                rows=50,
+                fetch_records=15,
+                iterations=3,
+                fetch_iterations=1,
+                isolate=False,
+            )
+            self.assertEqual(
+                set(results["cases"]),
+                {
+                    "fetch",
+                    "preview",
+                    "aggregate_1col",
+                    "aggregate_2col",
+                    "aggregate_3col",
+                },
+            )
+            self.assertEqual(results["cases"]["fetch"]["rows"], 15)
+            self.assertFalse(Dataset.objects.exists())
+            for case in results["cases"].values():
+                self.assertLessEqual(case["p50_ms"], case["p99_ms"])
+            path = save_results(results, tmpdir)
+            self.assertEqual(load_latest(tmpdir), results)
+            self.assertIsNone(load_latest(tmpdir, exclude=path))
+
 
 class ViewsTests(TestCase):
     def setUp(self):
         self.client = Client()
 
-    @patch("core.views.fetch_and_store_characters")
-    def test_download_dataset_post(self, mock_fetch):
-        mock_fetch.return_value = "file.csv"
+    @patch("core.jobs._get_executor")
+    def test_download_dataset_post(self, mock_executor):
         url = reverse("fetch_dataset")
-        response = self.client.post(url)
-        self.assertEqual(response.status_code, 200)
-        self.assertJSONEqual(response.content, {"status": "ok", "file": "file.csv"})
-        mock_fetch.assert_called_once()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 202)
+        job = DownloadJob.objects.get()
+        self.assertJSONEqual(
+            response.content, {"status": "ok", "job": job.pk, "created": True}
+        )
+        mock_executor.return_value.submit.assert_called_once()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            again = self.client.post(url)
+        self.assertEqual(again.json()["job"], job.pk)
+        self.assertFalse(again.json()["created"])
+        self.assertEqual(DownloadJob.objects.count(), 1)
+        mock_executor.return_value.submit.assert_called_once()
+
+        # The database itself refuses a second job in flight (e.g. created by
+        # another process).
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DownloadJob.objects.create()
+        job.status = DownloadJob.DONE
+        job.save()
+        DownloadJob.objects.create()
+
+    @patch("core.jobs.fetch_and_store_characters")
+    def test_download_job_progress_and_status(self, mock_fetch):
+        ds = Dataset.objects.create(filename="a.csv", download_date=timezone.now())
+
+        def fetch(progress):
+            progress(pages_fetched=3)
+            progress(rows_written=20)
+            return ds
+
+        mock_fetch.side_effect = fetch
+        job = DownloadJob.objects.create()
+        run_download_job(job.pk)
+        response = self.client.get(reverse("fetch_status", args=[job.pk]))
+        payload = response.json()
+        self.assertEqual(payload["status"], "done")
+        self.assertEqual(payload["pages_fetched"], 3)
+        self.assertEqual(payload["rows_written"], 20)
+        self.assertEqual(payload["dataset"], ds.pk)
+
+        mock_fetch.side_effect = RuntimeError("SWAPI down")
+        failed = DownloadJob.objects.create()
+        run_download_job(failed.pk)
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, DownloadJob.FAILED)
+        self.assertEqual(failed.error, "SWAPI down")
 
     def test_download_dataset_get_not_allowed(self):
         url = reverse("fetch_dataset")
@@ -175,9 +1007,40 @@ class ViewsTests(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         datasets = response.context["datasets"]
-        self.assertEqual(datasets[0]["pk"], ds1.pk)
-        self.assertEqual(datasets[1]["pk"], ds2.pk)
-        self.assertIn("formatted_date", datasets[0])
+        self.assertEqual(datasets[0].pk, ds1.pk)
+        self.assertEqual(datasets[1].pk, ds2.pk)
+        self.assertContains(
+            response,
+            timezone.localtime(now).strftime("%b. %-d, %Y, %-I:%M %p").lower(),
+        )
+        self.assertEqual(response.context["next_cursor"], "")
+
+    def test_index_view_keyset_pagination(self):
+        now = timezone.now()
+        created = [
+            Dataset.objects.create(filename=f"{i}.csv", download_date=now)
+            for i in range(3)
+        ] + [
+            Dataset.objects.create(
+                filename=f"old{i}.csv",
+                download_date=now - timezone.timedelta(days=i + 1),
+            )
+            for i in range(2)
+        ]
+        expected = [ds.pk for ds in created[2::-1]] + [ds.pk for ds in created[3:]]
+        url = reverse("index")
+        seen = []
+        params = {}
+        with override_settings(INDEX_PAGE_SIZE=2):
+            while True:
+                response = self.client.get(url, params)
+                seen += [ds.pk for ds in response.context["datasets"]]
+                if not response.context["next_cursor"]:
+                    break
+                params = {"after": response.context["next_cursor"]}
+            response = self.client.get(url, {"after": "garbage"})
+        self.assertEqual(seen, expected)
+        self.assertTrue(response.context["is_first_page"])
 
     def test_view_dataset_and_load_more(self):
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -206,6 +1069,191 @@ class ViewsTests(TestCase):
                 data = resp2.json()["rows"]
                 self.assertIsInstance(data, list)
 
+                resp3 = self.client.get(url_more, {"offset": 0, "sort": "-a"})
+                self.assertEqual(resp3.json()["rows"], [{"a": "1", "b": "2"}])
+                response = self.client.get(url, {"sort": "nope"})
+                self.assertEqual(response.context["sort"], "")
+
+                # Conditional requests are answered before any file is read.
+                self.assertIn("no-cache", response["Cache-Control"])
+                self.assertIn("max-age=", resp3["Cache-Control"])
+                with patch("core.views.load_dataset_preview") as mock_preview:
+                    page = self.client.get(
+                        url, {"sort": "nope"}, HTTP_IF_NONE_MATCH=response["ETag"]
+                    )
+                    more = self.client.get(
+                        url_more,
+                        {"offset": 0, "sort": "-a"},
+                        HTTP_IF_NONE_MATCH=resp3["ETag"],
+                    )
+                mock_preview.assert_not_called()
+                self.assertEqual(page.status_code, 304)
+                self.assertEqual(more.status_code, 304)
+                self.assertNotEqual(resp2["ETag"], resp3["ETag"])
+
+    async def test_export_streams_under_asgi(self):
+        rows = [["name", "eye_color"]] + [[f"n{i}", "blue"] for i in range(2500)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(BASE_DIR=tmpdir):
+                ds = store_table(rows)
+                ds.download_date = timezone.now()
+                await ds.asave()
+                url = reverse("export_dataset", args=[ds.pk, "ndjson"])
+                with warnings.catch_warnings():
+                    warnings.simplefilter("error")
+                    response = await self.async_client.get(url)
+                    self.assertTrue(response.is_async)
+                    chunks = [chunk async for chunk in response.streaming_content]
+
+                # Async views are profiled on the executor thread doing the work.
+                url = reverse("load_more_rows", args=[ds.pk])
+                with self.assertLogs("core.profile", "INFO") as logs:
+                    with override_settings(REQUEST_PROFILING=True):
+                        await self.async_client.get(url, {"offset": 1})
+                self.assertIn("load_dataset_preview", logs.records[0].event["stats"])
+        # Streamed chunk by chunk rather than buffered as one body.
+        self.assertEqual(len(chunks), 3)
+        lines = b"".join(chunks).decode().splitlines()
+        self.assertEqual(json.loads(lines[-1]), {"name": "n2499", "eye_color": "blue"})
+
+    def test_export_dataset_and_aggregation(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "export.csv"
+            path = os.path.join(data_dir, fname)
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["name", "eye_color"])
+                writer.writerows(
+                    [["Luke", "blue"], ["Leia", "brown"], ["Owen", "blue"]]
+                )
+            with open(path, "rb") as f:
+                content = f.read()
+            with override_settings(BASE_DIR=tmpdir):
+                ds = Dataset.objects.create(
+                    filename=fname, download_date=timezone.now()
+                )
+                url = reverse("export_dataset", args=[ds.pk, "csv"])
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b"".join(response.streaming_content), content)
+
+                response = self.client.get(url, HTTP_RANGE="bytes=15-")
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b"".join(response.streaming_content), content[15:])
+                self.assertEqual(
+                    response["Content-Range"],
+                    f"bytes 15-{len(content) - 1}/{len(content)}",
+                )
+                response = self.client.get(url, HTTP_RANGE=f"bytes={len(content)}-")
+                self.assertEqual(response.status_code, 416)
+
+                response = self.client.get(url, {"offset": 2})
+                self.assertEqual(b"".join(response.streaming_content), b"Owen,blue\r\n")
+
+                url = reverse("export_dataset", args=[ds.pk, "ndjson"])
+                response = self.client.get(url, {"sort": "-name"})
+                lines = b"".join(response.streaming_content).decode().splitlines()
+                self.assertEqual(
+                    [json.loads(line)["name"] for line in lines],
+                    ["Owen", "Luke", "Leia"],
+                )
+                url = reverse("export_dataset", args=[ds.pk, "xml"])
+                self.assertEqual(self.client.get(url).status_code, 400)
+
+                url = reverse("export_aggregation", args=[ds.pk, "csv"])
+                response = self.client.get(url, {"columns": ["eye_color"]})
+                self.assertEqual(
+                    b"".join(response.streaming_content).decode().splitlines(),
+                    ["eye_color,count", "blue,2", "brown,1"],
+                )
+                self.assertEqual(self.client.get(url).status_code, 400)
+
+    async def test_async_views_offload_file_reads(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            fname = "async.csv"
+            with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                csv.writer(f).writerows([["a"], ["1"], ["2"]])
+            with override_settings(BASE_DIR=tmpdir):
+                ds = await Dataset.objects.acreate(
+                    filename=fname, download_date=timezone.now()
+                )
+                url = reverse("load_more_rows", args=[ds.pk])
+                with patch("core.views.load_dataset_preview") as mock_preview:
+                    mock_preview.side_effect = lambda *args, **kwargs: [
+                        {"thread": threading.current_thread().name}
+                    ]
+                    response = await self.async_client.get(url, {"offset": 1})
+                self.assertTrue(
+                    response.json()["rows"][0]["thread"].startswith("view-io")
+                )
+                response = await self.async_client.get(url, {"offset": 1})
+                self.assertEqual(response.json()["rows"], [{"a": "2"}])
+
+                url = reverse("aggregate_dataset", args=[ds.pk])
+                response = await self.async_client.post(
+                    url, {"columns": ["a"]}, content_type="application/json"
+                )
+                self.assertEqual(response.json()["rows"][0]["count"], 1)
+                url = reverse("load_more_rows", args=[ds.pk + 1])
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 404)
+
+    def test_aggregate_trend_across_datasets(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_dir = os.path.join(tmpdir, "data", "characters")
+            os.makedirs(data_dir)
+            contents = {
+                "t1.csv": [["a", "b"], ["x", "1"], ["x", "1"], ["y", "2"]],
+                "t2.csv": [["a", "b"], ["x", "1"], ["y", "2"], ["y", "2"]],
+            }
+            for fname, rows in contents.items():
+                with open(os.path.join(data_dir, fname), "w", newline="") as f:
+                    csv.writer(f).writerows(rows)
+            now = timezone.now()
+            old = Dataset.objects.create(
+                filename="t1.csv", download_date=now - timezone.timedelta(days=2)
+            )
+            new = Dataset.objects.create(filename="t2.csv", download_date=now)
+            url = reverse("aggregate_trend")
+            with override_settings(BASE_DIR=tmpdir):
+                response = self.client.get(url, {"columns": ["b", "a"]})
+                self.assertEqual(response.status_code, 200)
+                result = response.json()["datasets"]
+                self.assertEqual([d["dataset"] for d in result], [old.pk, new.pk])
+                self.assertEqual(
+                    result[0]["rows"],
+                    [
+                        {"b": "1", "a": "x", "count": 2},
+                        {"b": "2", "a": "y", "count": 1},
+                    ],
+                )
+                self.assertEqual(result[1]["rows"][0], {"b": "2", "a": "y", "count": 2})
+
+                # Computed in worker processes, then served from the cache.
+                with patch("core.services.get_pool") as mock_pool:
+                    again = self.client.get(url, {"columns": ["a", "b"], "last": 1})
+                mock_pool.assert_not_called()
+                self.assertEqual(
+                    again.json()["datasets"][0]["rows"][0],
+                    {"a": "y", "b": "2", "count": 2},
+                )
+                response = self.client.get(
+                    url,
+                    {
+                        "columns": ["a"],
+                        "since": (now - timezone.timedelta(days=1)).date(),
+                    },
+                )
+                self.assertEqual(
+                    [d["dataset"] for d in response.json()["datasets"]], [new.pk]
+                )
+                response = self.client.get(url, {"columns": ["a"], "since": "x"})
+                self.assertEqual(response.status_code, 400)
+
     def test_aggregate_dataset(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             data_dir = os.path.join(tmpdir, "data", "characters")
@@ -227,13 +1275,21 @@ class ViewsTests(TestCase):
                 )
                 url = reverse("aggregate_dataset", args=[ds.pk])
 
-                resp_get = self.client.get(url)
-                self.assertEqual(resp_get.status_code, 405)
+                resp_put = self.client.put(url)
+                self.assertEqual(resp_put.status_code, 405)
 
                 resp_bad = self.client.post(
                     url, data=json.dumps({}), content_type="application/json"
                 )
                 self.assertJSONEqual(resp_bad.content, {"columns": [], "rows": []})
+                resp_bad = self.client.get(url, {"columns": "col", "limit": 0})
+                self.assertEqual(resp_bad.status_code, 400)
+                resp_bad = self.client.post(
+                    url,
+                    data=json.dumps({"columns": ["col"], "limit": -1}),
+                    content_type="application/json",
+                )
+                self.assertEqual(resp_bad.status_code, 400)
 
                 payload = {"columns": ["col"]}
                 resp = self.client.post(
@@ -243,3 +1299,71 @@ class ViewsTests(TestCase):
                 result = resp.json()
                 self.assertEqual(result["columns"], ["col"])
                 self.assertIsInstance(result["rows"], list)
+                self.assertNotIn("ETag", resp)
+
+                # The same aggregation as a cacheable GET, revalidated
+                # without reading the dataset.
+                resp = self.client.get(url, {"columns": "col"})
+                self.assertEqual(resp.json()["rows"], result["rows"])
+                self.assertIn("immutable", resp["Cache-Control"])
+                with patch(
+                    "core.views.aggregate_provided_dataset", return_value=[]
+                ) as mock_agg:
+                    resp_304 = self.client.get(
+                        url, {"columns": "col"}, HTTP_IF_NONE_MATCH=resp["ETag"]
+                    )
+                    resp_other = self.client.get(
+                        url,
+                        {"columns": "col", "limit": 1},
+                        HTTP_IF_NONE_MATCH=resp["ETag"],
+                    )
+                self.assertEqual(resp_304.status_code, 304)
+                self.assertEqual(resp_304["ETag"], resp["ETag"])
+                self.assertEqual(resp_other.status_code, 200)
+                self.assertEqual(mock_agg.call_count, 1)
+
+                # Drill-down from an aggregation row to the rows behind it.
+                search_url = reverse("search_dataset", args=[ds.pk])
+                resp = self.client.get(search_url, {"col": "X", "limit": 1})
+                self.assertEqual(resp.status_code, 200)
+                result = resp.json()
+                self.assertEqual(result["total"], 2)
+                self.assertEqual(result["row_ids"], [0])
+                self.assertEqual(result["rows"], [{"col": "X"}])
+                resp = self.client.get(search_url, {"other": "X"})
+                self.assertEqual(resp.status_code, 400)
+
+    def test_metrics_endpoint_and_stage_counters(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(BASE_DIR=tmpdir):
+                table = [["name", "col"], ["a", "X"], ["b", "Y"], ["c", "X"]]
+                ds = store_table(table)
+                ds.download_date = timezone.now()
+                ds.save()
+                scanned = ROWS_SCANNED.value(operation="preview", source="columnar")
+                written = ROWS_WRITTEN.value()
+
+                resp = self.client.get(
+                    reverse("load_more_rows", args=[ds.pk]), {"offset": 1}
+                )
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(
+                    ROWS_SCANNED.value(operation="preview", source="columnar"),
+                    scanned + 2,
+                )
+                self.assertEqual(ROWS_WRITTEN.value(), written)
+
+                with self.assertLogs("core.profile", "INFO") as logs:
+                    with override_settings(REQUEST_PROFILING=True):
+                        resp = self.client.get(reverse("metrics"))
+                self.assertIn("peak_traced_bytes", logs.records[0].event)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain"))
+        body = resp.content.decode()
+        self.assertIn('core_stage_seconds_count{stage="write_csv"}', body)
+        self.assertIn(
+            'core_http_request_seconds_count{view="load_more_rows",method="GET",'
+            'status="200"}',
+            body,
+        )
@@ -7,9 +7,29 @@ from . import views
 urlpatterns = [
     path("", IndexView.as_view(), name="index"),
     path("fetch/", views.download_dataset, name="fetch_dataset"),
+    path("fetch/<int:pk>/", views.download_status, name="fetch_status"),
     path("dataset/<int:pk>/", views.view_dataset, name="view_dataset"),
     path("dataset/<int:pk>/load_more/", views.load_more_rows, name="load_more_rows"),
     path(
         "dataset/<int:pk>/aggregate/", views.aggregate_dataset, name="aggregate_dataset"
     ),
+    path(
+        "dataset/<int:pk>/export/<slug:fmt>/",
+        views.export_dataset,
+        name="export_dataset",
+    ),
+    path(
+        "dataset/<int:pk>/aggregate/export/<slug:fmt>/",
+        views.export_aggregation,
+        name="export_aggregation",
+    ),
+    path(
+        "dataset/<int:pk>/diff/<int:other_pk>/",
+        views.diff_dataset,
+        name="diff_dataset",
+    ),
+    path("dataset/<int:pk>/search/", views.search_dataset, name="search_dataset"),
+    path("aggregate/trend/", views.aggregate_trend, name="aggregate_trend"),
+    path("cache/stats/", views.cache_stats, name="cache_stats"),
+    path("metrics/", views.metrics, name="metrics"),
 ]
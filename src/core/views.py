@@ -1,87 +1,455 @@
+import asyncio
+import hashlib
 import json
+import os
+import threading
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from functools import partial
 
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, render
-from django.utils import timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.generic import TemplateView
 
-from .models import Dataset
+from .cache import aggregation_cache
+from .diff import diff_datasets
+from .export import CONTENT_TYPES, stream_file, stream_rows
+from .jobs import enqueue_download
+from .metrics import registry
+from .middleware import profile_blocking
+from .models import Dataset, DownloadJob
+from .profiles import get_summary
+from .search import parse_filters, search_rows
 from .services import (
+    aggregate_datasets,
     aggregate_provided_dataset,
-    fetch_and_store_characters,
+    iter_dataset_rows,
     load_dataset_preview,
 )
+from .storage import dataset_path
 
 
-def download_dataset(request):
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_VIEW_WORKERS,
+                    thread_name_prefix="view-io",
+                )
+    return _executor
+
+
+async def _run_blocking(func, *args, **kwargs):
+    """
+    Runs blocking (file reading, petl) work on the bounded view executor,
+    so the event loop keeps serving other requests meanwhile. The work is
+    profiled along with the request when it is (see `MetricsMiddleware`).
+    """
+    loop = asyncio.get_running_loop()
+    call = profile_blocking(partial(func, *args, **kwargs))
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+async def _aiter_blocking(iterator):
+    """
+    Async iterator over a blocking iterator, each item pulled on the view
+    executor.
+    """
+    done = object()
+    while True:
+        item = await _run_blocking(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+def _stream(request, response):
+    """
+    Under ASGI, Django consumes a streaming response's synchronous iterator
+    in one go (buffering the whole body): hand it an async iterator pulling
+    the chunks on the view executor instead, so it is streamed as produced.
+    """
+    if isinstance(request, ASGIRequest) and response.streaming:
+        response.streaming_content = _aiter_blocking(iter(response.streaming_content))
+    return response
+
+
+async def _aget_dataset(pk):
+    try:
+        return await Dataset.objects.aget(pk=pk)
+    except Dataset.DoesNotExist:
+        raise Http404("No Dataset matches the given query.")
+
+
+def _etag(ds, *params):
+    """
+    Strong ETag of a response derived from dataset `ds` and the request
+    parameters that shape it. Dataset files never change, so this is known
+    before any of them is read.
+    """
+    key = json.dumps(
+        [settings.DATASET_ETAG_VERSION, ds.pk, ds.storage_name, *params],
+        default=str,
+    )
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def _cached(response, etag, immutable=True):
+    """
+    Adds the ETag and caching headers to a response derived from a
+    dataset: immutable ones may be cached for `DATASET_CACHE_MAX_AGE`,
+    others (rendered pages) are revalidated on every use.
+    """
+    response.headers["ETag"] = etag
+    if immutable:
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.DATASET_CACHE_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _job_payload(job):
+    return {
+        "job": job.pk,
+        "status": job.status,
+        "pages_fetched": job.pages_fetched,
+        "rows_written": job.rows_written,
+        "dataset": job.dataset_id,
+        "error": job.error,
+    }
+
+
+async def download_dataset(request):
     if request.method == "POST":
         try:
-            fname = fetch_and_store_characters()
-            return JsonResponse({"status": "ok", "file": fname})
+            job, created = await sync_to_async(enqueue_download)()
+            return JsonResponse(
+                {"status": "ok", "job": job.pk, "created": created}, status=202
+            )
         except Exception as e:
             return JsonResponse({"status": "error", "msg": str(e)}, status=500)
     return JsonResponse({"detail": "Method not allowed"}, status=405)
 
 
-def view_dataset(request, pk):
-    ds = get_object_or_404(Dataset, pk=pk)
-    data = load_dataset_preview(ds.filename, offset=0, limit=10)
+async def download_status(request, pk):
+    try:
+        job = await DownloadJob.objects.aget(pk=pk)
+    except DownloadJob.DoesNotExist:
+        raise Http404("No DownloadJob matches the given query.")
+    return JsonResponse(_job_payload(job))
 
-    if data:
-        num_cols = len(data[0].keys())
-        col_width = 100 / num_cols
-    else:
-        col_width = 0
-
-    return render(
-        request,
-        "detail.html",
-        {
-            "dataset": ds,
-            "data": data,
-            "col_width": col_width,
-        },
-    )
+
+def _sort_param(request, columns):
+    """
+    Returns the `sort` query parameter (a column, "-" prefixed for
+    descending order), or "" when it names no column.
+    """
+    sort = request.GET.get("sort", "")
+    return sort if sort.lstrip("-") in columns else ""
 
 
-def load_more_rows(request, pk):
-    ds = get_object_or_404(Dataset, pk=pk)
+async def view_dataset(request, pk):
+    ds = await _aget_dataset(pk)
+    etag = _etag(ds, "page", request.GET.get("sort", ""))
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return _cached(response, etag, immutable=False)
+
+    def load():
+        columns = ds.columns or get_summary(ds.storage_name)["columns"]
+        sort = _sort_param(request, columns)
+        data = load_dataset_preview(ds.storage_name, offset=0, limit=10, sort=sort)
+        col_width = 100 / len(columns) if columns else 0
+        return render(
+            request,
+            "detail.html",
+            {
+                "dataset": ds,
+                "columns": columns,
+                "sort": sort,
+                "data": data,
+                "col_width": col_width,
+            },
+        )
+
+    response = await _run_blocking(load)
+    return _cached(response, etag, immutable=False)
+
+
+async def load_more_rows(request, pk):
+    ds = await _aget_dataset(pk)
     try:
-        offset = int(request.GET.get("offset", 0))
+        offset = max(int(request.GET.get("offset", 0)), 0)
     except ValueError:
         offset = 0
-    rows = load_dataset_preview(ds.filename, offset=offset, limit=10)
-    return JsonResponse({"rows": rows})
+    etag = _etag(ds, "rows", offset, request.GET.get("sort", ""))
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return _cached(response, etag)
+
+    def load():
+        columns = ds.columns or get_summary(ds.storage_name)["columns"]
+        sort = _sort_param(request, columns)
+        return load_dataset_preview(ds.storage_name, offset=offset, limit=10, sort=sort)
+
+    rows = await _run_blocking(load)
+    return _cached(JsonResponse({"rows": rows}), etag)
+
+
+async def diff_dataset(request, pk, other_pk):
+    """
+    Returns the row-level diff from dataset `pk` to dataset `other_pk`,
+    matching rows on the `key` column (default "name").
+    """
+    old = await _aget_dataset(pk)
+    new = await _aget_dataset(other_pk)
+    try:
+        limit = min(max(int(request.GET.get("limit", 100)), 0), 1000)
+        result = await _run_blocking(
+            diff_datasets,
+            old.storage_name,
+            new.storage_name,
+            key=request.GET.get("key", "name"),
+            limit=limit,
+        )
+    except (KeyError, ValueError) as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    return JsonResponse({"old": old.pk, "new": new.pk, **result})
+
+
+async def search_dataset(request, pk):
+    """
+    Returns the rows matching the filters of the query string, e.g.
+    `?homeworld=Tatooine&height__gte=150`, see `search.parse_filters()`.
+    """
+    ds = await _aget_dataset(pk)
+    params = request.GET.copy()
+    try:
+        offset = max(int(params.pop("offset", [0])[0]), 0)
+        limit = min(max(int(params.pop("limit", [10])[0]), 1), 1000)
+        filters = parse_filters(params.lists())
+        result = await _run_blocking(
+            search_rows, ds.storage_name, filters, offset, limit
+        )
+    except (KeyError, ValueError) as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    return JsonResponse(result)
+
+
+async def export_dataset(request, pk, fmt):
+    """
+    Streams a whole dataset as CSV or NDJSON, optionally ordered by `sort`.
+    `offset` resumes an export at that row (CSV without the header line);
+    a plain CSV export of an uncompressed file also honours Range requests.
+    """
+    if fmt not in CONTENT_TYPES:
+        return JsonResponse({"detail": f"Unknown format: {fmt}"}, status=400)
+    ds = await _aget_dataset(pk)
+    try:
+        offset = max(int(request.GET.get("offset", 0)), 0)
+    except ValueError:
+        return JsonResponse({"detail": "Invalid offset"}, status=400)
+
+    def export():
+        columns = ds.columns or get_summary(ds.storage_name)["columns"]
+        sort = _sort_param(request, columns)
+        name = os.path.splitext(ds.filename)[0]
+        if fmt == "csv" and not sort and not offset and not ds.compression:
+            return stream_file(request, dataset_path(ds.storage_name), name)
+        header, rows = iter_dataset_rows(ds.storage_name, offset, sort)
+        return stream_rows(fmt, header, rows, name, with_header=not offset)
+
+    return _stream(request, await _run_blocking(export))
+
+
+async def export_aggregation(request, pk, fmt):
+    """
+    Streams the aggregation of the `columns` query parameters (repeated)
+    as CSV or NDJSON, with a trailing `count` column.
+    """
+    if fmt not in CONTENT_TYPES:
+        return JsonResponse({"detail": f"Unknown format: {fmt}"}, status=400)
+    ds = await _aget_dataset(pk)
+    cols = request.GET.getlist("columns")
+    if not cols:
+        return JsonResponse({"detail": "No columns given"}, status=400)
+    try:
+        limit = _limit_param(request.GET.get("limit"))
+        rows = await _run_blocking(
+            aggregate_provided_dataset, ds.storage_name, cols, limit
+        )
+    except (KeyError, ValueError) as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    header = cols + ["count"]
+    name = f"{os.path.splitext(ds.filename)[0]}_{'_'.join(cols)}"
+    rows = (tuple(row.values()) for row in rows)
+    return _stream(request, stream_rows(fmt, header, rows, name))
+
+
+def _limit_param(value):
+    """
+    Parses an aggregation `limit`: None when not given, else a positive
+    integer. Raises ValueError otherwise.
+    """
+    if value in (None, ""):
+        return None
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return limit
+
+
+def _encode_cursor(ds):
+    value = f"{ds.download_date.isoformat()}|{ds.pk}"
+    return urlsafe_b64encode(value.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """
+    Returns the `(download_date, pk)` position encoded in a listing cursor,
+    or None when it is missing or malformed.
+    """
+    try:
+        date, pk = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(date), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
 
 
 class IndexView(TemplateView):
+    """
+    Lists datasets newest first, `INDEX_PAGE_SIZE` at a time. Pages use
+    keyset pagination: the `after` cursor holds the position of the last
+    listed dataset, so any page is one range scan of the listing index,
+    however deep it is.
+    """
+
     template_name = "index.html"
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        datasets = Dataset.objects.order_by("-download_date")
-        ctx["datasets"] = [
-            {
-                "pk": ds.pk,
-                "formatted_date": timezone.localtime(ds.download_date)
-                .strftime("%b. %-d, %Y, %-I:%M %p")
-                .lower(),
-            }
-            for ds in datasets
-        ]
+        size = settings.INDEX_PAGE_SIZE
+        datasets = Dataset.objects.only("pk", "download_date").order_by(
+            "-download_date", "-pk"
+        )
+        position = _decode_cursor(self.request.GET.get("after", ""))
+        if position is not None:
+            date, pk = position
+            datasets = datasets.filter(
+                Q(download_date__lt=date) | Q(download_date=date, pk__lt=pk)
+            )
+        datasets = list(datasets[: size + 1])
+        ctx["datasets"] = datasets[:size]
+        ctx["is_first_page"] = position is None
+        ctx["next_cursor"] = (
+            _encode_cursor(datasets[size - 1]) if len(datasets) > size else ""
+        )
         return ctx
 
 
-def aggregate_dataset(request, pk):
-    if request.method != "POST":
+async def aggregate_dataset(request, pk):
+    """
+    Counts the value combinations of the given columns: a POST with a
+    `{"columns": [...], "limit": n}` JSON body, or a cacheable GET with
+    repeated `columns` and an optional `limit` query parameter.
+    """
+    if request.method not in ("GET", "HEAD", "POST"):
         return JsonResponse({"detail": "Method not allowed"}, status=405)
-    ds = get_object_or_404(Dataset, pk=pk)
+    ds = await _aget_dataset(pk)
+    etag = None
     try:
-        payload = json.loads(request.body)
-        cols = payload.get("columns") or []
+        if request.method == "POST":
+            payload = json.loads(request.body)
+            cols = payload.get("columns") or []
+            limit = _limit_param(payload.get("limit"))
+        else:
+            cols = request.GET.getlist("columns")
+            limit = _limit_param(request.GET.get("limit"))
+            etag = _etag(ds, "aggregate", cols, limit)
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                return _cached(response, etag)
         if not isinstance(cols, list) or not cols:
             return JsonResponse({"columns": [], "rows": []})
-        rows = aggregate_provided_dataset(ds.filename, cols)
-        return JsonResponse({"columns": cols, "rows": rows})
+        rows = await _run_blocking(
+            aggregate_provided_dataset, ds.storage_name, cols, limit
+        )
+        response = JsonResponse({"columns": cols, "rows": rows})
+        return _cached(response, etag) if etag else response
+    except (KeyError, ValueError) as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    except TimeoutError as e:
+        return JsonResponse({"detail": str(e)}, status=503)
     except Exception as e:
         return JsonResponse({"detail": str(e)}, status=500)
+
+
+async def aggregate_trend(request):
+    """
+    Returns per-dataset counts of the `columns` combinations (repeated
+    query parameter) over a set of datasets, oldest first: the `datasets`
+    pks given, or the `last` (default and at most `TREND_MAX_DATASETS`)
+    downloads, optionally between the `since` and `until` dates.
+    """
+    cols = request.GET.getlist("columns")
+    if not cols:
+        return JsonResponse({"detail": "No columns given"}, status=400)
+    datasets = Dataset.objects.only(
+        "pk", "download_date", "filename", "sha256", "compression"
+    ).order_by("-download_date", "-pk")
+    try:
+        pks = [int(pk) for pk in request.GET.getlist("datasets")]
+        if pks:
+            datasets = datasets.filter(pk__in=pks)
+        since, until = request.GET.get("since"), request.GET.get("until")
+        if since:
+            datasets = datasets.filter(
+                download_date__date__gte=date.fromisoformat(since)
+            )
+        if until:
+            datasets = datasets.filter(
+                download_date__date__lte=date.fromisoformat(until)
+            )
+        last = int(request.GET.get("last") or settings.TREND_MAX_DATASETS)
+        limit = _limit_param(request.GET.get("limit"))
+    except ValueError as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    last = min(max(last, 1), settings.TREND_MAX_DATASETS)
+    datasets = [ds async for ds in datasets[:last]][::-1]
+    try:
+        result = await _run_blocking(aggregate_datasets, datasets, cols, limit)
+    except KeyError as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    except TimeoutError as e:
+        return JsonResponse({"detail": str(e)}, status=503)
+    return JsonResponse({"columns": cols, "datasets": result})
+
+
+def cache_stats(request):
+    return JsonResponse({"aggregations": aggregation_cache.stats()})
+
+
+def metrics(request):
+    """
+    Metrics of this server process in the Prometheus text format.
+    """
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,47 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def _context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn"
+    )
+
+
+def get_pool(name, max_workers):
+    """
+    Returns the long-lived process pool `name`, starting it on first use.
+    Workers are started from a fork server (or spawned) rather than forked
+    from this multi-threaded process, and set Django up once: they keep
+    the settings of that time, so tasks get what they depend on (file
+    paths, data directory, engine) as arguments.
+    """
+    pool = _pools.get(name)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _pools[name] = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=_context(),
+                    initializer=django.setup,
+                )
+    return pool
+
+
+def reset_pool(name, pool):
+    """
+    Drops pool `name` (e.g. broken by a crashed worker) so the next
+    `get_pool()` starts a new one.
+    """
+    with _lock:
+        if _pools.get(name) is pool:
+            del _pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
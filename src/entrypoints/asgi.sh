@@ -0,0 +1,17 @@
+#!/bin/bash
+set -e
+
+while ! nc -z db 5432; do
+  sleep 0.1
+done
+
+echo "Gunicorn starting (ASGI, uvicorn workers)"
+
+# WEB_CONCURRENCY: worker processes, each running one event loop;
+# WEB_TIMEOUT: seconds before a silent worker is restarted.
+exec gunicorn config.asgi:application \
+  --worker-class uvicorn.workers.UvicornWorker \
+  --workers "${WEB_CONCURRENCY:-2}" \
+  --bind 0.0.0.0:8000 \
+  --timeout "${WEB_TIMEOUT:-120}" \
+  --access-logfile -